@@ -1,18 +1,20 @@
 
-import hashlib
 import sys
 import json
 import os
-import tempfile
+import collections
 
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
-from PIL.ImageQt import ImageQt, Image
+from PIL.ImageQt import ImageQt
 
+import packages.assets as assets
 import packages.connectors as connectors
 import packages.config as config
 import packages.audiorecorder as audiorecorder
+import packages.tracing as tracing
+import packages.profileschema as profileschema
 
 # --- Constants ---
 USER_PROFILES_DIR = "user_profiles"
@@ -24,19 +26,43 @@ EMERGENCY_COLOR = "#D32F2F"    # Strong red—unchanged
 BACKGROUND_COLOR = "#B4D6E3"  # Light, airy blue background
 ROUNDEDWIDGET_COLOR = "#C4E6F3"  # Light, airy blue background
 ERROR_COLOR = "#D32F2F"        # Same red for errors
+USER_BUBBLE_COLOR = "#d2f0ff"  # Pale blue behind the user's own messages
 FONT_SIZE = "20px"
 
 # --- Helper Functions --
+# Decoded images by (path, scale). Filled by preload_images() at startup so hovering and
+# switching screens only hand out pixmaps that are already in memory.
+PIXMAPS: dict[tuple[str, float], QPixmap] = {}
+ICONS: dict[tuple[str, float], QIcon] = {}
+EMOJI_ICONS: dict[tuple[str, int], QIcon] = {}
+
 def load_image(image_path, scaleFactor=.3):
-    if not os.path.exists(image_path):
+    key = (image_path, scaleFactor)
+    if key in PIXMAPS:
+        return PIXMAPS[key]
+    prebuilt = assets.built(image_path, scaleFactor)
+    if prebuilt:
+        pix = QPixmap(prebuilt)
+    elif not os.path.exists(image_path):
         print(f"Warning: Image file not found at '{image_path}'.")
         return QPixmap()
-    img = Image.open(image_path)
-    img = img.resize((int(img.width * scaleFactor), int(img.height * scaleFactor)))
-    qim = ImageQt(img)
-    pix = QPixmap.fromImage(qim)
+    else:
+        # Not built by im.py yet: scale it here, once
+        pix = QPixmap.fromImage(ImageQt(assets.render(image_path, scaleFactor)))
+    PIXMAPS[key] = pix
     return pix
 
+def load_icon(image_path, scaleFactor=.3):
+    key = (image_path, scaleFactor)
+    if key not in ICONS:
+        ICONS[key] = QIcon(load_image(image_path, scaleFactor))
+    return ICONS[key]
+
+# Needs the QApplication to exist
+def preload_images():
+    for source, scale, _ in assets.UI_IMAGES:
+        load_icon(source, scale)
+
 # --- Rounded widget ---
 
 class signalHolder(QWidget):
@@ -66,6 +92,8 @@ class HushApp(QMainWindow):
         self.setGeometry(100, 100, 567, 1162)
         self.setWindowIcon(QIcon())
         self.current_user_data = None
+        self.session_token = None
+        self.profile_version = None
 
         if not os.path.exists(USER_PROFILES_DIR):
             os.makedirs(USER_PROFILES_DIR)
@@ -91,6 +119,7 @@ class HushApp(QMainWindow):
         
         # --- Start on the Login Screen ---
         self.stacked_widget.setCurrentWidget(self.login_screen)
+        self.login_screen.load_cached_info()
 
     def apply_stylesheet(self):
         style = f"""
@@ -153,6 +182,10 @@ class HushApp(QMainWindow):
                 font-size: {FONT_SIZE};
                 color: {TEXT_COLOR};
             }}
+            QListView#ChatDisplay {{
+                border: none;
+                font-size: {FONT_SIZE};
+            }}
             QTextEdit#ChatDisplay {{
                 background-color: #FFFFFF;
                 border: 2px solid {ACCENT_COLOR};
@@ -177,10 +210,18 @@ class HushApp(QMainWindow):
         self.login_screen.password_input.clear() # Clear password on return
         self.stacked_widget.setCurrentWidget(self.login_screen)
 
-    def login_successful(self, user_data):
-        self.current_user_data = user_data
+    def login_successful(self, user_data, token=None, version=None):
+        self.set_profile(user_data, token, version)
         self.switch_to_ai_page()
 
+    def set_profile(self, user_data, token, version):
+        self.current_user_data = user_data
+        self.session_token = token
+        self.profile_version = version
+        self.ai_page.llmcs.token = token
+        if token:
+            self.login_screen.cache_info(user_data["credentials"]["username"], token, version, user_data)
+
     def switch_to_ai_page(self):
         self.stacked_widget.setCurrentWidget(self.ai_page)
 
@@ -190,8 +231,14 @@ class LoginScreen(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         self.parent_window = parent
+        # Profile service replies arrive on the connection thread; the UI is updated on the UI thread
+        self.resumefailedsignal = signalHolder()
+        self.resumefailedsignal.signal.connect(self.onResumeFailed)
+        self.loggedinsignal = signalHolder()
+        self.loggedinsignal.signal.connect(self.onLoggedIn)
+        self.errorsignal = signalHolder()
+        self.errorsignal.signal.connect(lambda error: self.error_label.setText(error))
         self.init_ui()
-        self.load_cached_info()
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -238,28 +285,62 @@ class LoginScreen(QWidget):
         username = self.username_input.text().strip()
         password = self.password_input.text()
 
-        prof_cs = connectors.profilesClientSide(config.PROFL_SERVICE_HOST)
-        prof_cs.onClientError = lambda error: self.error_label.setText(error)
+        prof_cs = self.connect_profiles()
+        if not prof_cs:
+            return
+        prof_cs.onClientError = lambda error: self.errorsignal.signal.emit(error)
         prof_cs.onGotProfile = lambda profile: self.onGotProfile(profile, prof_cs)
         prof_cs.log_in(username, password)
 
+    def connect_profiles(self):
+        try:
+            return connectors.profilesClientSide(config.PROFL_SERVICE_HOST)
+        except Exception as e:
+            self.error_label.setText(f"Could not reach the profile service: {e}")
+            return None
+
     def onGotProfile(self, profile: dict, prof_cs: connectors.profilesClientSide):
         prof_cs.sclient.close()
-        username = self.username_input.text().strip()
-        password = self.password_input.text()
-        self.cache_info(username, password)
-        self.parent_window.login_successful(profile)
+        self.loggedinsignal.signal.emit(json.dumps({"profile": profile, "token": prof_cs.token, "version": prof_cs.version}))
+
+    def onLoggedIn(self, data: str):
+        data = json.loads(data)
+        self.parent_window.login_successful(data["profile"], data["token"], data["version"])
     
-    def cache_info(self, username, password):
+    def cache_info(self, username, token, version, profile):
+        # Only the session token is kept on disk, never the password
         with open(CACHE_FILE, 'w') as f:
-            json.dump({'username': username, 'password': password}, f)
+            json.dump({'username': username, 'token': token, 'version': version, 'profile': profile}, f)
+
+    # Without the profile service the cached session is kept and the login form stays up
+    def resume_session(self, cache: dict):
+        prof_cs = self.connect_profiles()
+        if not prof_cs:
+            return
+        def onerror(error):
+            prof_cs.sclient.close()
+            self.resumefailedsignal.signal.emit(error)
+        prof_cs.onClientError = onerror
+        prof_cs.onGotProfile = lambda profile: self.onGotProfile(profile, prof_cs)
+        prof_cs.onNotModified = lambda: self.onGotProfile(cache["profile"], prof_cs)
+        prof_cs.version = cache["version"]
+        prof_cs.resume(cache["token"], cache["version"])
+
+    def onResumeFailed(self, error: str):
+        if os.path.exists(CACHE_FILE):
+            os.remove(CACHE_FILE)
+        self.error_label.setText(error)
 
     def load_cached_info(self):
         if os.path.exists(CACHE_FILE):
             try:
                 with open(CACHE_FILE, 'r') as f:
                     cache = json.load(f)
-                    self.username_input.setText(cache["username"])
+                self.username_input.setText(cache["username"])
+                if "token" in cache:
+                    self.resume_session(cache)
+                elif "password" in cache:
+                    # Cache written before session tokens: log in once, the token replaces the password
                     self.password_input.setText(cache["password"])
                     self.attempt_login()
             except (json.JSONDecodeError, KeyError):
@@ -420,7 +501,7 @@ class SignUpScreen(QWidget):
         profile_data = {
             "credentials": {
                 "username": username,
-                "password": hashlib.sha256(password.encode()).hexdigest()
+                "password": password
             },
             "general": {
                 "first_name": self.first_name_input.text(),
@@ -451,6 +532,12 @@ class SignUpScreen(QWidget):
             }
         }
 
+        # --- Reject invalid profiles before touching the network ---
+        error = profileschema.validate(profile_data)
+        if error:
+            self.error_label.setText(f"Invalid profile: {profileschema.format_error(error)}")
+            return
+
         # --- Save data to file and log in ---
         try:
             profl_cs = connectors.profilesClientSide(config.PROFL_SERVICE_HOST)
@@ -473,6 +560,160 @@ class HoverQPushButton(QPushButton):
         self.onhoverexit.emit()
         super().leaveEvent(event)
 
+# --- Chat transcript ---
+# The transcript is a list model drawn by a delegate: only visible rows are painted, no
+# widget exists per message, and appending a message is a single row insert.
+
+class ChatMessage:
+    def __init__(self, text: str, user: bool):
+        self.text = text
+        self.user = user
+        self.version = 0 # bumped on every edit so cached layouts are redone
+        self.layout = None # ((version, width), QSize) from the last sizeHint
+
+class ChatModel(QAbstractListModel):
+    MessageRole = Qt.UserRole
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.messages: list[ChatMessage] = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.messages[index.row()]
+        if role == Qt.DisplayRole:
+            return message.text
+        if role == self.MessageRole:
+            return message
+        return None
+
+    def append(self, text: str, user: bool = False):
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(ChatMessage(text, user))
+        self.endInsertRows()
+        return row
+
+    def set_text(self, row: int, text: str):
+        message = self.messages[row]
+        message.text = text
+        message.version += 1
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def append_text(self, row: int, text: str):
+        self.set_text(row, self.messages[row].text+text)
+
+class ChatDelegate(QStyledItemDelegate):
+    MARGIN = 6
+    PADDING = 10
+    RADIUS = 12
+    BUBBLE_WIDTH = .8 # of the view width
+
+    def __init__(self, view: QListView, maxdocuments: int = 128):
+        super().__init__(view)
+        self.view = view
+        self.maxdocuments = maxdocuments
+        # Laid out documents of recently painted rows; sizes of all rows live on the messages
+        self.documents: collections.OrderedDict[tuple, QTextDocument] = collections.OrderedDict()
+
+    def document(self, message: ChatMessage, width: int):
+        key = (id(message), message.version, width)
+        if key in self.documents:
+            self.documents.move_to_end(key)
+            return self.documents[key]
+        doc = QTextDocument()
+        doc.setDocumentMargin(0)
+        doc.setDefaultFont(self.view.font())
+        if message.user:
+            doc.setPlainText(message.text)
+            limit = int(width*self.BUBBLE_WIDTH)-2*self.PADDING
+            if doc.size().width() > limit:
+                doc.setTextWidth(limit)
+        else:
+            doc.setHtml(message.text)
+            doc.setTextWidth(width)
+        self.documents[key] = doc
+        while len(self.documents) > self.maxdocuments:
+            self.documents.popitem(last=False)
+        return doc
+
+    def sizeHint(self, option, index):
+        message = index.data(ChatModel.MessageRole)
+        width = self.view.viewport().width()
+        key = (message.version, width)
+        if message.layout is None or message.layout[0] != key:
+            size = self.document(message, width).size().toSize()
+            if message.user:
+                size += QSize(2*self.PADDING, 2*self.PADDING)
+            message.layout = (key, QSize(width, size.height()+2*self.MARGIN))
+        return message.layout[1]
+
+    def paint(self, painter, option, index):
+        message = index.data(ChatModel.MessageRole)
+        doc = self.document(message, self.view.viewport().width())
+        context = QAbstractTextDocumentLayout.PaintContext()
+        rect = option.rect
+        painter.save()
+        if message.user:
+            size = doc.size()
+            bubble = QRectF(rect.right()-size.width()-2*self.PADDING, rect.top()+self.MARGIN,
+                            size.width()+2*self.PADDING, size.height()+2*self.PADDING)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(USER_BUBBLE_COLOR))
+            painter.drawRoundedRect(bubble, self.RADIUS, self.RADIUS)
+            painter.translate(bubble.left()+self.PADDING, bubble.top()+self.PADDING)
+            context.palette.setColor(QPalette.Text, QColor("#000"))
+        else:
+            painter.translate(rect.left(), rect.top()+self.MARGIN)
+            context.palette.setColor(QPalette.Text, QColor(TEXT_COLOR))
+        doc.documentLayout().draw(painter, context)
+        painter.restore()
+
+    # Streamed text only moves the rows below when the message grew a line
+    def textchanged(self, index):
+        message = index.data(ChatModel.MessageRole)
+        before = message.layout[1] if message.layout else None
+        if self.sizeHint(None, index) != before:
+            self.sizeHintChanged.emit(index)
+
+class ChatView(QListView):
+    def __init__(self, model: ChatModel):
+        super().__init__()
+        self.setObjectName("ChatDisplay")
+        self.setModel(model)
+        self.chatdelegate = ChatDelegate(self)
+        self.setItemDelegate(self.chatdelegate)
+        model.dataChanged.connect(lambda top, bottom, roles=[]: self.chatdelegate.textchanged(top))
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.verticalScrollBar().setSingleStep(20)
+        # Rows are laid out a batch at a time so long transcripts don't stall the UI
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(500)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        # Keeps following the end of the conversation, also while batches are still laid
+        # out, until the user scrolls up
+        self.follow = True
+        scrollbar = self.verticalScrollBar()
+        scrollbar.valueChanged.connect(lambda value: setattr(self, "follow", value >= scrollbar.maximum()))
+        scrollbar.rangeChanged.connect(lambda low, high: scrollbar.setValue(high) if self.follow else None)
+
+    # QListView only relayouts a vertical list when its height changes, but wrapped text
+    # depends on the width
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if event.size().width() != event.oldSize().width():
+            self.scheduleDelayedItemsLayout()
+
 class AIPage(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
@@ -480,6 +721,9 @@ class AIPage(QWidget):
         self.init_ui()
 
     def emoji_to_qicon(self, emoji: str, size: int = 64) -> QIcon:
+        if (emoji, size) in EMOJI_ICONS:
+            return EMOJI_ICONS[(emoji, size)]
+
         # Create a QPixmap to draw the emoji
         pixmap = QPixmap(size, size)
         pixmap.fill(Qt.transparent)
@@ -491,7 +735,8 @@ class AIPage(QWidget):
         painter.drawText(pixmap.rect(), Qt.AlignCenter, emoji)
         painter.end()
 
-        return QIcon(pixmap)
+        EMOJI_ICONS[(emoji, size)] = QIcon(pixmap)
+        return EMOJI_ICONS[(emoji, size)]
 
     def create_emoji_button(self, emoji, label_text):
         button = QPushButton()
@@ -564,7 +809,7 @@ class AIPage(QWidget):
             }}
         """)
         
-        profilepicture = HoverQPushButton(QIcon(load_image("profile.png")), None, None)
+        profilepicture = HoverQPushButton(load_icon("profile.png"), None, None)
         
         profilepicture.setFixedHeight(80)
         profilepicture.setFixedWidth(80)
@@ -592,9 +837,8 @@ class AIPage(QWidget):
         #topbarlayout.addSpacing(75)
         topbarlayout.addWidget(profilepicture)
 
-        self.chat_display = QVBoxLayout()
-        self.chat_display.setObjectName("ChatDisplay")
-        self.chat_display.addStretch(1)
+        self.chat = ChatModel(self)
+        self.chat_display = ChatView(self.chat)
 
         self.btnwrapper = RoundedWidget()
         button_layout = QHBoxLayout()
@@ -644,37 +888,32 @@ class AIPage(QWidget):
         self.btnwrapper.setLayout(button_layout)
         self.mic.clicked.connect(self.onmicclicked)
 
-        # Container widget for layout
-        chat_container = QWidget()
-        chat_container.setLayout(self.chat_display)
-
-        # Scroll area to wrap the container
-        chat_scroll_area = QScrollArea()
-        chat_scroll_area.setWidgetResizable(True)
-        chat_scroll_area.setWidget(chat_container)
-        chat_scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-        chat_scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        
         layout.addLayout(topbarlayout)
         layout.addSpacing(40)
         layout.addWidget(q1_label)
         layout.addLayout(self.feelings_group)
         layout.addSpacing(40)
-        layout.addWidget(chat_scroll_area)
+        layout.addWidget(self.chat_display)
         layout.addWidget(self.btnwrapper)
         self.setLayout(layout)
-        self.llmcs = connectors.llmClientSide(self.parent_window.current_user_data, config.LLM_SERVICE_HOST)
+        self.llmcs = connectors.llmClientSide(self.parent_window.session_token, config.LLM_SERVICE_HOST)
         self.llmcs.onendstream = self.onendstreamprompt
         self.oes = lambda:None
         self.audiorecorder = None
         self.ad_cs = connectors.audioDescClientSide(config.AUDESC_SERVICE_HOST)
-        self.ad_cs.gotAudioDescription = self.onaudiodescribed
+        # Descriptions arrive on the connection thread; the transcript is changed on the UI thread
+        self.describedsignal = signalHolder()
+        self.describedsignal.signal.connect(self.onaudiodescribed)
+        self.ad_cs.gotAudioDescription = lambda description: self.describedsignal.signal.emit(description)
+        # The recorder detects the end of speech on its own thread; stop from the UI thread
+        self.autostopsignal = signalHolder()
+        self.autostopsignal.signal.connect(lambda _: self.endmic() if self.audiorecorder else None)
 
     def pfpenter(self, button: QPushButton):
-        button.setIcon(QIcon(load_image("profile-hover.png")))
+        button.setIcon(load_icon("profile-hover.png"))
 
     def pfpexit(self, button: QPushButton):
-        button.setIcon(QIcon(load_image("profile.png")))
+        button.setIcon(load_icon("profile.png"))
 
     def onmicclicked(self):
         if self.audiorecorder:
@@ -683,126 +922,101 @@ class AIPage(QWidget):
             self.startmic()
 
     def startmic(self):
-        self.audiorecorder = audiorecorder.Recorder()
+        self.audio_trace_id = tracing.new_trace_id()
+        self.audiorecorder = audiorecorder.Recorder(
+            use_vad = config.AUDIO_VAD,
+            auto_stop = config.AUDIO_AUTO_STOP,
+            on_auto_stop = lambda: self.autostopsignal.signal.emit("")
+        )
+        answer_token = self.parent_window.session_token if config.AUDIO_SINGLE_PASS else None
+        self.audiostream = self.ad_cs.begin_stream(self.audio_trace_id, self.audiorecorder.RATE, config.AUDIO_CODEC, config.AUDIO_UPLOAD_RATE, answer_token)
+        self.audiorecorder.on_chunk = self.audiostream.push
         self.audiorecorder.start_recording()
 
     def endmic(self):
-        frames = self.audiorecorder.stop_recording()
-        tmpfile = tempfile.mktemp(".wav", "tmp", tempfile.gettempdir())
-        self.audiorecorder.frames_to_file(frames, tmpfile)
-        self.audiorecorder.frames_to_file(frames, "test2.wav")
-        self.ad_cs.describe(tmpfile)
+        with tracing.tracer.span("ui.endmic", self.audio_trace_id):
+            self.audiorecorder.stop_recording()
+            self.audiostream.end()
+        tracing.tracer.instant("audio.vad", self.audio_trace_id, dropped_seconds=self.audiorecorder.dropped_seconds)
         self.audiorecorder = None
+        self.audiostream = None
+        if config.AUDIO_SINGLE_PASS:
+            self.showvoiceanswer(self.audio_trace_id)
+
+    # Single-pass mode: the answer streams from the audio service and the description fills
+    # in the user's message whenever it arrives
+    def showvoiceanswer(self, trace_id: str):
+        prompt = self.showSendPrompt("🎤 ...")
+        ai_response = self.addmessage("")
+
+        described = signalHolder()
+        described.signal.connect(lambda text: self.chat.set_text(prompt, text))
+        answered = signalHolder()
+        answered.signal.connect(lambda text: self.onStreamPartRecieved(text, ai_response, trace_id))
+        self.ad_cs.gotAudioDescription = lambda description: described.signal.emit(description)
+        self.ad_cs.onAnswerPart = lambda text: answered.signal.emit(text)
 
     def onaudiodescribed(self, description):
+        trace_id = self.audio_trace_id
         self.showSendPrompt(description)
-        ai_response = QLabel("")
-        ai_response.setWordWrap(True)
-        ai_response.setTextFormat(Qt.RichText)
-        self.chat_display.addWidget(ai_response)
-        self.llmcs.addToStream = lambda text: self.onStreamPartRecieved(text, ai_response)
-        self.llmcs.generate_response(f"{{'input-type': 'text', 'description': '{description}'}}")
+        ai_response = self.addmessage("")
+        sigh = signalHolder()
+        sigh.signal.connect(lambda text: self.onStreamPartRecieved(text, ai_response, trace_id))
+        self.llmcs.addToStream = lambda text: sigh.signal.emit(text)
+        self.llmcs.generate_response(f"{{'input-type': 'text', 'description': '{description}'}}", trace_id)
 
     def start_conversation(self):
-        self.addwidgettostretchlay(QLabel("I'm here to help. Tell me what's happening."), self.chat_display)
+        self.addmessage("I'm here to help. Tell me what's happening.")
         self.user_input.setFocus()
 
-    def addwidgettostretchlay(self, widget, layout: QBoxLayout):
-        stretch_index = layout.count()
-        for i in range(layout.count()):
-            item = layout.itemAt(i)
-            if item.spacerItem() is not None:
-                stretch_index = i
-                break
-        layout.insertWidget(stretch_index, widget)
-
-    def addlayouttostretchlay(self, widget, layout: QBoxLayout):
-        stretch_index = layout.count()
-        for i in range(layout.count()):
-            item = layout.itemAt(i)
-            if item.spacerItem() is not None:
-                stretch_index = i
-                break
-        layout.insertLayout(stretch_index, widget)
-    
+    # Returns the row, which streamed text is appended to
+    def addmessage(self, text: str, user: bool = False):
+        return self.chat.append(text, user)
+
     def send_message(self):
         user_text = self.user_input.text().strip()
         if not user_text: return
+        trace_id = tracing.new_trace_id()
 
-        usermessagewidget = QWidget()
-        layout = QHBoxLayout(usermessagewidget)
-        layout.addStretch(1)
-        usermessagewidget.setStyleSheet(f"""background-color: #d2f0ff;
-                            color: #000;
-                            padding: 10px;
-                            border-radius: 12px;
-                            font-size: {FONT_SIZE};
-                            margin: 6px 0;""")
-        layout.addWidget(QLabel(user_text))
-        usermessagewidget.setLayout(layout)
-
-        usermessagelayout = QHBoxLayout()
-        usermessagelayout.addStretch(1)
-        usermessagelayout.addWidget(usermessagewidget)
-
-        self.addlayouttostretchlay(usermessagelayout, self.chat_display)
+        self.showSendPrompt(user_text)
         self.user_input.clear()
         self.send.setDisabled(True)
         self.llmcs.onendstream = self.onendstreamprompt
-        ai_response = QLabel("")
-        ai_response.setWordWrap(True)
-        ai_response.setTextFormat(Qt.RichText)
+        ai_response = self.addmessage("")
 
         sigh = signalHolder()
-        sigh.signal.connect(lambda text: self.onStreamPartRecieved(text, ai_response))
+        sigh.signal.connect(lambda text: self.onStreamPartRecieved(text, ai_response, trace_id))
         self.llmcs.addToStream = lambda text: sigh.signal.emit(text)
-        self.llmcs.generate_response(f"{{'input-type': 'text', 'content': '{user_text}'}}")
-        self.addwidgettostretchlay(ai_response, self.chat_display)
+        self.llmcs.generate_response(f"{{'input-type': 'text', 'content': '{user_text}'}}", trace_id)
 
     def onendstreamprompt(self):
         self.send.setDisabled(False)
         self.llmcs.addToStream = self.oes
 
     def showSendPrompt(self, prompt):
-        usermessagewidget = QWidget()
-        layout = QHBoxLayout(usermessagewidget)
-        layout.addStretch(1)
-        usermessagewidget.setStyleSheet(f"""background-color: #d2f0ff;
-                            color: #000;
-                            padding: 10px;
-                            border-radius: 12px;
-                            font-size: {FONT_SIZE};
-                            margin: 6px 0;""")
-        layout.addWidget(QLabel(prompt))
-        usermessagewidget.setLayout(layout)
-
-        usermessagelayout = QHBoxLayout()
-        usermessagelayout.addStretch(1)
-        usermessagelayout.addWidget(usermessagewidget)
-
-        self.addlayouttostretchlay(usermessagelayout, self.chat_display)
+        return self.addmessage(prompt, user=True)
 
     def onEmojiClicked(self, emoji: str):
+        trace_id = tracing.new_trace_id()
         self.showSendPrompt(f"I am {emoji}")
 
         self.send.setDisabled(True)
 
-        ai_response = QLabel("")
-        ai_response.setWordWrap(True)
-        ai_response.setTextFormat(Qt.RichText)
+        ai_response = self.addmessage("")
         sigh = signalHolder()
-        sigh.signal.connect(lambda text: self.onStreamPartRecieved(text, ai_response))
+        sigh.signal.connect(lambda text: self.onStreamPartRecieved(text, ai_response, trace_id))
         self.llmcs.addToStream = lambda text: sigh.signal.emit(text)
-        self.llmcs.generate_response(f"{{'input-type': 'text', 'content': 'I am {emoji}'}}")
-
-        self.addwidgettostretchlay(ai_response, self.chat_display)
+        self.llmcs.generate_response(f"{{'input-type': 'text', 'content': 'I am {emoji}'}}", trace_id)
 
-    def onStreamPartRecieved(self, text: str, qlabel: QLabel):
-        qlabel.setText(qlabel.text()+text)
+    def onStreamPartRecieved(self, text: str, row: int, trace_id: str = None):
+        with tracing.tracer.span("ui.render", trace_id, chars=len(text)):
+            self.chat.append_text(row, text)
 
 # --- Main Execution ---
 if __name__ == "__main__":
+    tracing.set_process_name("client")
     app = QApplication(sys.argv)
+    preload_images()
     window = HushApp()
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
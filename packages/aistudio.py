@@ -14,6 +14,8 @@ class Chat:
         self.client=client
         self.model = model
         self.contents: list[Content] = []
+        self.usage = None
+        self.last_prompt = None
 
     def set_system_instructions(self, instructions):
         instructions = Content(
@@ -32,26 +34,23 @@ class Chat:
     def clear(self):
         self.contents = []
 
-    def prompt(self, prompt):
-        self.contents += [
-            Content(
-                role="user",
-                parts=[
-                    Part(text = prompt)
-                ]
-            )
-        ]
+    # parts are extra Parts (e.g. audio_part) sent in the same user turn as the text
+    def prompt(self, prompt, parts: list[Part] = None):
+        self.last_prompt = Content(
+            role="user",
+            parts=[
+                Part(text = prompt)
+            ] + (parts or [])
+        )
+        self.contents += [self.last_prompt]
         contents = copy.copy(self.contents)
         sysinstructions = None
         if contents[0].role != "user":
             sysinstructions = contents[0].parts[0].text
             contents=contents[1:]
 
-        generator = (i.text for i in hookGenerator((
-            lambda streamPart: self.addToContentText(
-                streamPart.text
-            )
-            ), self.client.models.generate_content_stream(
+        self.usage = None
+        generator = (i.text for i in hookGenerator(self.onStreamPart, self.client.models.generate_content_stream(
             model = self.model, 
             contents = contents,
             config=GenerateContentConfig(
@@ -70,6 +69,15 @@ class Chat:
 
         return generator
 
+    # Swaps a turn's parts for text, so bulky media is not sent again with every later prompt
+    def replace_turn(self, content: Content, text: str):
+        content.parts = [Part(text = text)]
+
+    def onStreamPart(self, streamPart):
+        self.addToContentText(streamPart.text)
+        if streamPart.usage_metadata:
+            self.usage = streamPart.usage_metadata
+
     def addToContentText(self, add):
         try:
             self.contents[-1].parts[0].text += add
@@ -112,6 +120,9 @@ class AIStudio:
     def get_chat(self, model):
         return Chat(self.client, model)
 
+def audio_part(data: bytes, mime_type: str = "audio/wav"):
+    return Part.from_bytes(data=data, mime_type=mime_type)
+
 def set_apikey(api_key: str):
     os.environ["apikey"] = api_key
 
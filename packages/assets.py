@@ -0,0 +1,70 @@
+import os
+
+from PIL import Image, ImageDraw
+
+# Images the UI shows, as (source, scale, crop to circle). build() writes each of them
+# pre-scaled into ASSETS_DIR and leaves the sources alone; the GUI loads the built files
+# as they are, so it does no resizing or cropping at runtime.
+ASSETS_DIR = "assets"
+UI_IMAGES = [
+    ("logo.png", .3, False),
+    ("profile.png", .3, True),
+    ("profile-hover.png", .3, True),
+]
+
+def asset_path(source: str, scale: float):
+    stem, ext = os.path.splitext(os.path.basename(source))
+    return os.path.join(ASSETS_DIR, f"{stem}-{round(scale*100)}{ext}")
+
+# The built file for (source, scale), or None when it is missing or older than its source
+def built(source: str, scale: float):
+    path = asset_path(source, scale)
+    if not os.path.exists(path) or not os.path.exists(source):
+        return None
+    if os.path.getmtime(path) < os.path.getmtime(source):
+        return None
+    return path
+
+def crop_circle(img: Image.Image):
+    width, height = img.size
+
+    # Calculate center
+    center_x, center_y = width // 2, height // 2
+    radius = width/2
+
+    # Same-sized mask with a white filled circle at the center
+    mask = Image.new("L", img.size, 0)
+    draw = ImageDraw.Draw(mask)
+    draw.ellipse(
+        (center_x - radius, center_y - radius, center_x + radius, center_y + radius),
+        fill=255
+    )
+
+    # Apply mask to image
+    result = Image.new("RGBA", img.size)
+    result.paste(img, (0, 0), mask)
+
+    # Crop to bounding box of the circle
+    return result.crop((
+        center_x - radius,
+        center_y - radius,
+        center_x + radius,
+        center_y + radius
+    ))
+
+def render(source: str, scale: float, circle: bool = False):
+    img = Image.open(source).convert("RGBA")
+    if circle:
+        img = crop_circle(img)
+    return img.resize((int(img.width * scale), int(img.height * scale)))
+
+def build(force: bool = False):
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    written = []
+    for source, scale, circle in UI_IMAGES:
+        if not force and built(source, scale):
+            continue
+        path = asset_path(source, scale)
+        render(source, scale, circle).save(path)
+        written.append(path)
+    return written
@@ -0,0 +1,92 @@
+import collections
+import datetime
+import hashlib
+import io
+import threading
+import time
+import wave
+
+import packages.metrics as metrics
+
+AUDIO_CACHE_LOOKUPS = metrics.counter("hush_audesc_cache_lookups_total", "Audio description cache lookups", ("cache", "result"))
+
+# Recordings are keyed by their samples and format rather than the file bytes, so the same
+# audio still matches when it arrives with a different header or container layout.
+def pcm_key(data: bytes):
+    digest = hashlib.sha256()
+    try:
+        with wave.open(io.BytesIO(data)) as wf:
+            digest.update(f"pcm{wf.getnchannels()}/{wf.getsampwidth()}/{wf.getframerate()}".encode())
+            digest.update(wf.readframes(wf.getnframes()))
+    except (wave.Error, EOFError):
+        digest = hashlib.sha256(b"raw")
+        digest.update(data)
+    return digest.hexdigest()
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int = 256, ttl: float = 3600):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: collections.OrderedDict[str, tuple] = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.keylocks: dict[str, list] = {}
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(key)
+                AUDIO_CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                return entry[0]
+            if entry:
+                del self.entries[key]
+        AUDIO_CACHE_LOOKUPS.labels(self.name, "miss").inc()
+        return None
+
+    def put(self, key: str, value, ttl: float = None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic()+(self.ttl if ttl is None else ttl))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    # Concurrent callers with the same key (a retry racing the original request) wait for
+    # the first one instead of repeating the work
+    def get_or_create(self, key: str, create):
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self.lock:
+            keylock = self.keylocks.setdefault(key, [threading.Lock(), 0])
+            keylock[1] += 1
+        try:
+            with keylock[0]:
+                value = self.get(key)
+                if value is None:
+                    value = self.put(key, create())
+                return value
+        finally:
+            with self.lock:
+                keylock[1] -= 1
+                if not keylock[1]:
+                    del self.keylocks[key]
+
+# Gemini keeps uploaded files for a limited time; a handle is reused until shortly before
+# its expiration_time.
+class UploadRegistry(TTLCache):
+    def __init__(self, maxsize: int = 256, margin: float = 300, default_ttl: float = 47*3600):
+        super().__init__("uploads", maxsize, default_ttl)
+        self.margin = margin
+
+    def put(self, key: str, file):
+        expires = getattr(file, "expiration_time", None)
+        if isinstance(expires, datetime.datetime):
+            ttl = expires.timestamp()-time.time()-self.margin
+        else:
+            ttl = self.ttl
+        if ttl <= 0:
+            return file
+        return super().put(key, file, ttl)
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Compact encodings for uploading 16-bit mono speech. "mulaw" companding stores each sample
+# in one byte (2x smaller), and halving the rate to 8 kHz, which keeps the speech band,
+# halves it again. The server decodes back to 16-bit PCM before describing.
+
+FORMATS = ("pcm16", "mulaw")
+MU = 255
+
+def mulaw_encode(samples: np.ndarray):
+    x = np.clip(samples.astype(np.float32)/32768, -1, 1)
+    y = np.sign(x)*np.log1p(MU*np.abs(x))/np.log1p(MU)
+    return np.rint((y+1)*127.5).astype(np.uint8).tobytes()
+
+def mulaw_decode(data: bytes):
+    y = np.frombuffer(data, dtype=np.uint8).astype(np.float32)/127.5-1
+    x = np.sign(y)*np.expm1(np.abs(y)*np.log1p(MU))/MU
+    return np.rint(x*32767).astype("<i2").tobytes()
+
+def decode(data: bytes, fmt: str):
+    if fmt == "mulaw":
+        return mulaw_decode(data)
+    if fmt == "pcm16":
+        return data
+    raise ValueError(f"Unsupported audio format: {fmt}")
+
+# Windowed-sinc low-pass below the new Nyquist frequency, applied before dropping every other sample
+def lowpass_taps(cutoff: float, count: int = 31):
+    n = np.arange(count)-(count-1)/2
+    taps = 2*cutoff*np.sinc(2*cutoff*n)*np.hamming(count)
+    return (taps/taps.sum()).astype(np.float32)
+
+HALFBAND_TAPS = lowpass_taps(0.225)
+
+# Stateful so that chunks can be encoded as they are recorded: the filter history and
+# the decimation phase carry over from one chunk to the next.
+class Encoder:
+    def __init__(self, fmt: str = "mulaw", rate: int = 16000, target_rate: int = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported audio format: {fmt}")
+        target_rate = target_rate or rate
+        if target_rate not in (rate, rate//2):
+            raise ValueError("Only the original rate or half of it is supported")
+        self.fmt = fmt
+        self.rate = rate
+        self.target_rate = target_rate
+        self.history = np.zeros(len(HALFBAND_TAPS)-1, dtype=np.float32)
+        self.phase = 0
+
+    @property
+    def meta(self):
+        return {"format": self.fmt, "rate": self.target_rate, "channels": 1}
+
+    def decimate(self, samples: np.ndarray):
+        if not len(samples):
+            return samples
+        x = np.concatenate([self.history, samples.astype(np.float32)])
+        self.history = x[len(x)-len(self.history):]
+        y = np.convolve(x, HALFBAND_TAPS, "valid")
+        out = y[self.phase::2]
+        self.phase = (self.phase+len(y)) % 2
+        return np.clip(np.rint(out), -32768, 32767).astype("<i2")
+
+    def encode(self, pcm: bytes):
+        samples = np.frombuffer(pcm, dtype="<i2")
+        if self.target_rate != self.rate:
+            samples = self.decimate(samples)
+        if self.fmt == "mulaw":
+            return mulaw_encode(samples)
+        return samples.astype("<i2").tobytes()
@@ -1,10 +1,45 @@
 import dotenv
+import io
 import shutil
+
+import packages.config as config
+import packages.audiocache as audiocache
 dotenv.load_dotenv()
 
-def describe(ais, audio_file):
-    file = ais.client.files.upload(file=audio_file)
-    shutil.copyfile(audio_file, "test.wav")
+DESCRIPTIONS = audiocache.TTLCache("descriptions", config.AUDIO_CACHE_SIZE, config.AUDIO_CACHE_TTL)
+UPLOADS = audiocache.UploadRegistry(config.AUDIO_CACHE_SIZE)
+
+# Keeps a copy of the last described recording for debugging, only with config.AUDIO_DEBUG_DUMP
+def dump(audio, path: str = "test.wav"):
+    if isinstance(audio, str):
+        shutil.copyfile(audio, path)
+        return
+    position = audio.tell()
+    with open(path, "wb") as f:
+        shutil.copyfileobj(audio, f)
+    audio.seek(position)
+
+def read(audio):
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            return f.read()
+    position = audio.tell()
+    data = audio.read()
+    audio.seek(position)
+    return data
+
+# audio is a file path or a file object such as a BytesIO. Identical recordings (retries,
+# replayed clips) are answered from the cache, and a clip is uploaded to Gemini at most once
+# while its file handle is still valid.
+def describe(ais, audio, mime_type: str = "audio/wav"):
+    if config.AUDIO_DEBUG_DUMP:
+        dump(audio)
+    data = read(audio)
+    key = audiocache.pcm_key(data)
+    return DESCRIPTIONS.get_or_create(key, lambda: generate_description(ais, key, data, mime_type))
+
+def generate_description(ais, key: str, data: bytes, mime_type: str):
+    file = UPLOADS.get_or_create(key, lambda: ais.client.files.upload(file=io.BytesIO(data), config={"mime_type": mime_type}))
     content = ais.client.models.generate_content(
         model = ais.gemini25flash, 
         contents = [
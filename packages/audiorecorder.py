@@ -1,9 +1,15 @@
+import io
 import pyaudio
 import wave
 import threading
 
+import packages.vad as vad
+
 class Recorder:
-    def __init__(self):
+    # With on_chunk set, every captured chunk is handed over as it arrives instead of
+    # being kept until stop_recording. With use_vad, silence is dropped before either, and
+    # auto_stop ends the recording after that many seconds of quiet following speech.
+    def __init__(self, on_chunk=None, use_vad: bool = False, auto_stop: float = None, on_auto_stop=None):
         self.CHUNK = 1024
         self.FORMAT = pyaudio.paInt16
         self.CHANNELS = 1
@@ -13,6 +19,12 @@ class Recorder:
         self.p = None
         self.stream = None
         self.thread = None
+        self.on_chunk = on_chunk
+        self.use_vad = use_vad
+        self.auto_stop = auto_stop
+        self.on_auto_stop = on_auto_stop
+        self.gate = None
+        self.dropped_seconds = 0.0
 
     def start_recording(self):
         self.p = pyaudio.PyAudio()
@@ -23,6 +35,7 @@ class Recorder:
             input=True,
             frames_per_buffer=self.CHUNK
         )
+        self.gate = vad.VoiceGate(self.RATE, self.auto_stop) if self.use_vad else None
         self.recording = True
         self.thread = threading.Thread(target=self.record)
         self.thread.start()
@@ -34,6 +47,9 @@ class Recorder:
         self.stream.stop_stream()
         self.stream.close()
         self.p.terminate()
+        if self.gate:
+            self.gate.flush()
+            self.dropped_seconds = self.gate.dropped_seconds
         frames = self.frames
         self.frames = []
         return frames
@@ -41,16 +57,30 @@ class Recorder:
     def record(self):
         while self.recording:
             data = self.stream.read(self.CHUNK, exception_on_overflow=False)
-            self.frames.append(data)
+            if self.gate:
+                data = self.gate.feed(data)
+            if self.on_chunk:
+                if data:
+                    self.on_chunk(data)
+            else:
+                self.frames.append(data)
+            if self.gate and self.gate.should_stop:
+                self.recording = False
+                if self.on_auto_stop:
+                    self.on_auto_stop()
+
+    def frames_to_bytes(self, frames: list):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wf:
+            wf.setnchannels(self.CHANNELS)
+            wf.setsampwidth(pyaudio.get_sample_size(self.FORMAT))
+            wf.setframerate(self.RATE)
+            wf.writeframes(b''.join(frames))
+        return buffer.getvalue()
 
     def frames_to_file(self, frames: list, file: str):
         if not file.endswith(".wav"):
             file = file+".wav"
             print("Warning (audio.Recorder.record): file must end in .wav, new file name:",file)
-        with wave.open(file, 'wb') as wf:
-            wf.setnchannels(self.CHANNELS)
-            wf.setsampwidth(self.p.get_sample_size(self.FORMAT))
-            wf.setframerate(self.RATE)
-            wf.writeframes(b''.join(frames))
-        with open(file, 'rb') as f:
-            print(f.read())
\ No newline at end of file
+        with open(file, 'wb') as f:
+            f.write(self.frames_to_bytes(frames))
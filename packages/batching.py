@@ -0,0 +1,71 @@
+import concurrent.futures
+import queue
+import threading
+import time
+
+import packages.metrics as metrics
+
+BATCH_SIZE = metrics.histogram("hush_batch_size", "Items per batched call", ("batcher",), buckets=(1, 2, 4, 8, 16, 32, 64))
+BATCH_WAIT = metrics.histogram("hush_batch_queue_seconds", "Time items spent waiting to join a batch", ("batcher",))
+
+# Collects items submitted from many threads and runs fn on up to max_batch of them at once.
+# A batch starts as soon as it is full, or max_wait_ms after its first item arrived, so a
+# lone request is delayed by at most max_wait_ms. fn takes a list and returns a list of
+# results in the same order.
+class MicroBatcher:
+    def __init__(self, fn, max_batch: int = 8, max_wait_ms: float = 5, name: str = "batch"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms/1000
+        self.name = name
+        self.queue = queue.Queue()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        future = concurrent.futures.Future()
+        self.queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def collect(self):
+        batch = [self.queue.get()]
+        if batch[0] is None:
+            return None
+        deadline = time.perf_counter()+self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline-time.perf_counter()
+            try:
+                entry = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self.queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def run(self):
+        while self.running:
+            batch = self.collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            BATCH_SIZE.labels(self.name).observe(len(batch))
+            for _, _, submitted in batch:
+                BATCH_WAIT.labels(self.name).observe(started-submitted)
+            try:
+                results = self.fn([item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+    def close(self):
+        self.running = False
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,146 @@
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import packages.config as config
+import packages.passwords as passwords
+import packages.profileschema as profileschema
+import packages.profilestore as profilestore
+
+# Bulk profile import/export as JSONL, one profile per line.
+#
+#   python -m packages.bulkprofiles import profiles.jsonl [--errors errors.jsonl]
+#   python -m packages.bulkprofiles export profiles.jsonl
+#
+# Input is read and written in batches, so memory stays constant whatever the file size.
+# Imported passwords are plaintext and hashed in a process pool, unless --prehashed is
+# given (e.g. for files produced by export).
+
+def open_input(path: str):
+    return sys.stdin if path == "-" else open(path)
+
+def open_output(path: str):
+    return sys.stdout if path == "-" else open(path, "w")
+
+def close(handle):
+    # The standard streams belong to the caller
+    if handle not in (sys.stdin, sys.stdout, sys.stderr):
+        handle.close()
+
+def batches(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class Report:
+    def __init__(self, errors, every: float = 2.0):
+        self.errors = errors
+        self.every = every
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.done = 0
+        self.failed = 0
+
+    def error(self, line: int, username, message: str):
+        self.failed += 1
+        self.errors.write(json.dumps({"line": line, "username": username, "error": message})+"\n")
+
+    def progress(self, count: int, final: bool = False):
+        self.done += count
+        now = time.perf_counter()
+        if final or now-self.last >= self.every:
+            self.last = now
+            rate = (self.done+self.failed)/max(now-self.start, 1e-9)
+            print(f"{self.done} ok, {self.failed} failed, {rate:.0f} records/s", file=sys.stderr)
+
+def parse(batch: list, report: Report):
+    valid = []
+    for number, line in batch:
+        if not line.strip():
+            continue
+        try:
+            profile = json.loads(line)
+        except ValueError as e:
+            report.error(number, None, f"Invalid JSON: {e}")
+            continue
+        error = profileschema.validate(profile)
+        if error:
+            credentials = profile.get("credentials") if isinstance(profile, dict) else None
+            username = credentials.get("username") if isinstance(credentials, dict) else None
+            report.error(number, username, profileschema.format_error(error))
+            continue
+        valid.append((number, profile))
+    return valid
+
+def import_profiles(store: profilestore.ProfileStore, source, report: Report, pool, workers: int, batch_size: int, prehashed: bool):
+    for batch in batches(enumerate(source, 1), batch_size):
+        valid = parse(batch, report)
+        if not valid:
+            continue
+        if not prehashed:
+            hashed = pool.map(
+                passwords.hash_password,
+                [profile["credentials"]["password"] for _, profile in valid],
+                itertools.repeat(config.SCRYPT_N), itertools.repeat(config.SCRYPT_R), itertools.repeat(config.SCRYPT_P),
+                chunksize = max(1, len(valid)//(4*workers))
+            )
+            for (_, profile), password in zip(valid, hashed):
+                profile["credentials"]["password"] = password
+        created = store.create_many([(profile["credentials"]["username"], profile) for _, profile in valid])
+        count = 0
+        for (number, profile), ok in zip(valid, created):
+            if ok:
+                count += 1
+            else:
+                report.error(number, profile["credentials"]["username"], "Username is taken")
+        report.progress(count)
+    report.progress(0, final=True)
+
+def export_profiles(store: profilestore.ProfileStore, output, report: Report, batch_size: int):
+    for batch in batches(store.iter_profiles(), batch_size):
+        output.write("".join(json.dumps(profile)+"\n" for profile in batch))
+        report.progress(len(batch))
+    report.progress(0, final=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of HUSH profiles as JSONL")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("file", help="JSONL file, or - for stdin/stdout")
+    parser.add_argument("--store", choices=["sqlite", "file"], default=config.PROFILE_STORE)
+    parser.add_argument("--location", help="database file or profile directory")
+    parser.add_argument("--errors", default="-", help="where to write per-record errors as JSONL (default: stderr)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=config.HASH_WORKERS)
+    parser.add_argument("--prehashed", action="store_true", help="passwords are already stored hashes")
+    args = parser.parse_args(argv)
+
+    store = profilestore.open_store(args.store, args.location)
+    errors = sys.stderr if args.errors == "-" else open(args.errors, "w")
+    report = Report(errors)
+    handle = open_input(args.file) if args.command == "import" else open_output(args.file)
+    try:
+        if args.command == "import":
+            workers = args.workers or os.cpu_count() or 1
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers = workers,
+                mp_context = multiprocessing.get_context("spawn")
+            ) as pool:
+                import_profiles(store, handle, report, pool, workers, args.batch_size, args.prehashed)
+        else:
+            export_profiles(store, handle, report, args.batch_size)
+            handle.flush()
+    finally:
+        close(handle)
+        close(errors)
+    return 1 if report.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,44 @@
 LLM_SERVICE_HOST = "localhost"
 PROFL_SERVICE_HOST = "localhost"
-AUDESC_SERVICE_HOST = "localhost"
\ No newline at end of file
+AUDESC_SERVICE_HOST = "localhost"
+VISION_SERVICE_HOST = "localhost"
+
+# Backend profile storage: "sqlite" for deployments, "file" (one JSON per user) for development
+PROFILE_STORE = "sqlite"
+PROFILE_DB = "user_profiles.db"
+PROFILE_DIR = "user_profiles"
+
+# Password KDF (scrypt) work factor and the process pool that runs it
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+HASH_WORKERS = None
+HASH_MAX_PENDING = 64
+HASH_PER_CLIENT = 2
+
+# Drop silence from recordings before upload, and optionally stop recording after this many seconds of quiet (e.g. 3.0, None to disable)
+AUDIO_VAD = True
+AUDIO_AUTO_STOP = None
+
+# Upload encoding for recordings: "mulaw" (1 byte per sample) or "pcm16", at 16000 or 8000 Hz
+AUDIO_CODEC = "mulaw"
+AUDIO_UPLOAD_RATE = 8000
+
+# Answer voice messages in one model call with the audio attached, instead of describing first
+AUDIO_SINGLE_PASS = False
+
+# Audio descriptions and Gemini file handles are reused for identical recordings
+AUDIO_CACHE_SIZE = 256
+AUDIO_CACHE_TTL = 3600
+
+# Write the last recording the audio service described to test.wav
+AUDIO_DEBUG_DUMP = False
+
+# Run the vision service in the backend (needs OpenCV, detectron2 and its model weights)
+VISION_ENABLED = False
+# Vision service batching: frames wait up to VISION_MAX_WAIT_MS for others to share a forward pass
+VISION_MAX_BATCH = 4
+VISION_MAX_WAIT_MS = 10
+# Light preset (480px, fewer proposals) with the box head quantized to int8; the quantized model is cached in VISION_CACHE_DIR
+VISION_OPTIMIZED = False
+VISION_CACHE_DIR = "model_cache"
@@ -1,14 +1,29 @@
 import packages.aistudio as aistudio
 import packages.listeners as listeners
 import packages.audioparser as audioparser
+import packages.querylog as querylog
+import packages.metrics as metrics
+import packages.tracing as tracing
+import packages.profilecache as profilecache
+import packages.passwords as passwords
+import packages.profileschema as profileschema
+import packages.sessions as sessions
+import packages.profilepatch as profilepatch
+import packages.sockcomm as sockcomm
+import packages.audiocodec as audiocodec
+import packages.batching as batching
+import packages.config as config
 from packages.listeners import getPrivateIp
 
-import tempfile
+import concurrent.futures
+import io
 import json
 import os
+import queue
 import socket
-import copy
-import hashlib
+import threading
+import time
+import wave
 
 import dotenv
 env = dotenv.dotenv_values()
@@ -16,15 +31,56 @@ env = dotenv.dotenv_values()
 LLM_PORT = 8801
 PROFL_PORT = 8802
 AUDESC_PORT = 8803
+VISION_PORT = 8804
+METRICS_PORT = 8810
 DATA_SPLITTER = bytearray([1,1,1,1])
+# Voice turns in single-pass mode; once described they are stored like the two-pass queries
+VOICE_PROMPT = "{'input-type': 'voice', 'description': 'the attached audio'}"
+def voice_query(description: str):
+    return f"{{'input-type': 'text', 'description': '{description}'}}"
+
+AUDIO_CHUNK_SIZE = 64*1024
+AUDIO_WINDOW = 16
+AUDIO_MAX_UPLOAD = 64*1024*1024
+# Largest frame the audio service accepts: a chunk plus its header, or a START with its metadata
+AUDIO_MAX_FRAME = AUDIO_CHUNK_SIZE+1024
+
+LLM_REQUESTS = metrics.counter("hush_llm_requests_total", "Prompts handled by the LLM service")
+LLM_LATENCY = metrics.histogram("hush_llm_request_seconds", "Time from receiving a prompt to the end of the answer stream")
+LLM_PREPARE = metrics.histogram("hush_llm_prepare_chat_seconds", "Time spent in prepare_chat")
+LLM_TTFT = metrics.histogram("hush_llm_time_to_first_token_seconds", "Time from calling Gemini to the first streamed part")
+LLM_STREAM = metrics.histogram("hush_llm_stream_seconds", "Time from the first to the last streamed part")
+LLM_TOKENS = metrics.counter("hush_llm_tokens_total", "Gemini tokens used", ("kind",))
+LLM_TOKEN_RATE = metrics.histogram("hush_llm_output_tokens_per_second", "Output tokens per second of streaming", buckets=metrics.RATE_BUCKETS)
+PROFL_LOGINS = metrics.counter("hush_profl_logins_total", "Login attempts", ("result",))
+PROFL_SIGNUPS = metrics.counter("hush_profl_signups_total", "Sign-up attempts", ("result",))
+PROFL_LATENCY = metrics.histogram("hush_profl_request_seconds", "Time spent handling a profile request", ("kind",))
+AUDESC_UPLOAD_BYTES = metrics.counter("hush_audesc_upload_bytes_total", "Audio bytes uploaded by clients")
+AUDESC_UPLOAD_SIZE = metrics.histogram("hush_audesc_upload_bytes", "Size of uploaded recordings", buckets=metrics.SIZE_BUCKETS)
+AUDESC_DESCRIBE = metrics.histogram("hush_audesc_describe_seconds", "Time spent describing a recording")
+VISION_REQUESTS = metrics.counter("hush_vision_requests_total", "Frames received by the vision service", ("result",))
+VISION_INFERENCE = metrics.histogram("hush_vision_inference_seconds", "Time spent running the detector on a batch of frames")
+VISION_FRAME_SIZE = metrics.histogram("hush_vision_frame_bytes", "Size of encoded frames sent by clients", buckets=metrics.SIZE_BUCKETS)
+PROFL_RESUMES = metrics.counter("hush_profl_resumes_total", "Session resume attempts", ("result",))
+PROFL_UPDATES = metrics.counter("hush_profl_updates_total", "Profile update attempts", ("result",))
+
+SYSTEM_INSTRUCTIONS = "You are an AI to help children with different forms of autism in moments of stress or panic to calm down. Only include one question and a couple of sentences per response. You are not able to do any function calls like calling phones. You are able to put hyperlinks to phone numbers in the response by inserting \'<a href=\"tel:[number]\">[text]</a>\'. Get to the point of solving the problem, and not just providing calming strategies. However, if the user does need to be calmed down, for example in the case of them being angry, provide a calming strategy first, but in the case of something more serious, for example being hurt, dont provide calming strategies. If they do need to be calmed before fixing the problem, you are only allowed to offer 2 calming strategies before going to ix the problem. Child profile: "
+
+# Profiles leave the profile service without their password hash
+def public_profile(profile: dict):
+    return dict(profile, credentials={"username": profile["credentials"]["username"]})
 
 class llmServerSide:
-    def __init__(self):
+    def __init__(self, profiles: profilecache.ProfileCache = None, signer: sessions.SessionSigner = None):
         self.studio = aistudio.AIStudio(env['apikey'])
         self.chats: dict[str, aistudio.Chat] = {}
+        # username -> (profile version, instructions built from it)
+        self.instructions: dict[str, tuple] = {}
+        self.profiles = profiles or profilecache.ProfileCache()
+        self.sessions = signer or sessions.SessionSigner(sessions.load_secret(env.get('sessionsecret')))
 
-        self.sserver = listeners.createListener(LLM_PORT)
-        self.filepath = os.path.join(os.getcwd(), "logs/llm.log")
+        self.sserver = listeners.createListener(LLM_PORT, "llm", framed=True)
+        self.querylog = querylog.QueryLog(os.path.join(os.getcwd(), "logs"), "llm")
         self.startStreamPckt = bytearray([2])
         self.stopStreamPckt = bytearray([3])
 
@@ -34,6 +90,7 @@ class llmServerSide:
         self.sserver.onerror = self.onerror
 
     def start(self):
+        self.querylog.start()
         self.sserver.start()
 
     def log(self, text: str):
@@ -42,34 +99,102 @@ class llmServerSide:
     def onopen(self, conn: socket.socket):
         self.log(f"Connection from {conn.getpeername()}")
 
-    def load_profile(self, name: str):
-        if not name in self.chats:
-            return {}
-        with open(os.path.join(os.getcwd(), "user_profiles", f"{name}.json"))as f:
-            return f.read()
-        
-    def prepare_chat(self, profile: dict) -> aistudio.Chat:
-        if profile['credentials']['username'] in self.chats:
-            chat = self.chats[profile['credentials']['username']]
+    def build_instructions(self, profile: dict):
+        return SYSTEM_INSTRUCTIONS + json.dumps(public_profile(profile))
+
+    def prepare_chat(self, username: str) -> aistudio.Chat:
+        if username in self.chats:
+            chat = self.chats[username]
         else:
             chat = self.studio.get_chat(self.studio.gemini25flash)
-            self.chats[profile['credentials']['username']] = chat
-        sysinstructions = "You are an AI to help children with different forms of autism in moments of stress or panic to calm down. Only include one question and a couple of sentences per response. You are not able to do any function calls like calling phones. You are able to put hyperlinks to phone numbers in the response by inserting \'<a href=\"tel:[number]\">[text]</a>\'. Get to the point of solving the problem, and not just providing calming strategies. However, if the user does need to be calmed down, for example in the case of them being angry, provide a calming strategy first, but in the case of something more serious, for example being hurt, dont provide calming strategies. If they do need to be calmed before fixing the problem, you are only allowed to offer 2 calming strategies before going to ix the problem. Child profile: " + json.dumps(profile)
-        chat.set_system_instructions(sysinstructions)
+            self.chats[username] = chat
+        # Instructions are rebuilt whenever the stored profile has a new version, whoever wrote it
+        found = self.profiles.lookup(username)
+        profile, version = found if found else ({"credentials": {"username": username}}, None)
+        cached = self.instructions.get(username)
+        if cached is None or cached[0] != version:
+            cached = (version, self.build_instructions(profile))
+            self.instructions[username] = cached
+        if chat.system_instructions is not cached[1]:
+            chat.set_system_instructions(cached[1])
         return chat
 
+    # The user is whoever the session token was issued to, never a name the client sends
+    def session_user(self, data: bytes):
+        try:
+            request = json.loads(data)
+        except ValueError:
+            return None
+        token = request.get("token") if isinstance(request, dict) else None
+        return self.sessions.verify(token) if isinstance(token, str) else None
+
     def onmessage(self, conn: socket.socket, data: bytes):
         parts = data.split(DATA_SPLITTER)
-        profile = json.loads(parts[0])
-        chat = self.prepare_chat(profile)
-
-        query = parts[1].decode('utf-8')
-        conn.send(self.startStreamPckt)
-        for part in chat.prompt(query):
-            conn.send(part.encode())
-        conn.send(self.stopStreamPckt)
-        with open(self.filepath, "a") as f:
-            f.write(f"{conn.getpeername()}: Query from {profile['credentials']['username']}:\n\n{query}")
+        trace_id = parts[2].decode() if len(parts) > 2 else tracing.new_trace_id()
+        tracing.tracer.flow_end(trace_id)
+        user = self.session_user(parts[0])
+        if not user:
+            sockcomm.send_frame(conn, self.startStreamPckt)
+            sockcomm.send_frame(conn, b"Your session has expired. Please log in again.")
+            sockcomm.send_frame(conn, self.stopStreamPckt)
+            return
+        host, port = conn.getpeername()[:2]
+        self.answer(
+            user, parts[1].decode('utf-8'), trace_id, f"{host}:{port}",
+            send = lambda text: sockcomm.send_frame(conn, text.encode()),
+            begin = lambda: sockcomm.send_frame(conn, self.startStreamPckt)
+        )
+        sockcomm.send_frame(conn, self.stopStreamPckt)
+
+    # Streams the answer to query through send() and records metrics, trace spans and the
+    # query log. Returns the chat and the user turn that was added to it.
+    def answer(self, user: str, query: str, trace_id: str, peer: str, send, begin=lambda:None, parts: list = None):
+        ts = time.time()
+        start = time.perf_counter()
+        received = tracing.now_us()
+        with LLM_PREPARE.time(), tracing.tracer.span("llm.prepare_chat", trace_id):
+            chat = self.prepare_chat(user)
+
+        begin()
+        upstream = time.perf_counter()
+        upstream_us = tracing.now_us()
+        first = None
+        stream = chat.prompt(query, parts)
+        turn = chat.last_prompt
+        for part in stream:
+            if first is None:
+                first = time.perf_counter()
+                first_us = tracing.now_us()
+                LLM_TTFT.observe(first-upstream)
+                tracing.tracer.record("llm.upstream_first_byte", trace_id, upstream_us, first_us)
+            send(part)
+        end = time.perf_counter()
+        end_us = tracing.now_us()
+
+        usage = chat.usage
+        if first is not None:
+            tracing.tracer.record("llm.stream", trace_id, first_us, end_us)
+        tracing.tracer.record("llm.request", trace_id, received, end_us, user=user)
+        LLM_REQUESTS.inc()
+        LLM_LATENCY.observe(end-start)
+        if first is not None:
+            LLM_STREAM.observe(end-first)
+        if usage:
+            LLM_TOKENS.labels("prompt").inc(usage.prompt_token_count or 0)
+            LLM_TOKENS.labels("output").inc(usage.candidates_token_count or 0)
+            if first is not None and end > first and usage.candidates_token_count:
+                LLM_TOKEN_RATE.observe(usage.candidates_token_count/(end-first))
+        self.querylog.log(
+            ts = ts,
+            request_id = trace_id,
+            user = user,
+            peer = peer,
+            latency = end-start,
+            prompt_tokens = usage.prompt_token_count if usage else None,
+            output_tokens = usage.candidates_token_count if usage else None,
+            query = query
+        )
+        return chat, turn
 
     def onclose(self, addr):
         self.log(f"{addr}: Connection closed")
@@ -79,18 +204,21 @@ class llmServerSide:
         #raise
 
 class llmClientSide:
-    def __init__(self, profile, host):
-        self.profile = profile
+    def __init__(self, token, host):
+        # Session token from the profile service; the server answers as the user it names
+        self.token = token
         self.startStreamPckt = 2
         self.stopStreamPckt = 3
 
-        self.sclient = listeners.connectToListener(host, LLM_PORT)
+        self.sclient = listeners.connectToListener(host, LLM_PORT, framed=True)
         self.sclient.onmessage = self.onmessage
 
         if not self.sclient.running:
             raise Exception("Server is offline")
 
         self.streamstarted = False
+        self.trace_id = None
+        self.sent_at = None
     
     def addToStream(self, streampart: str):
         pass
@@ -105,24 +233,42 @@ class llmClientSide:
         pckttype = message[0]
         if pckttype == self.startStreamPckt:
             self.streamstarted = True
+            if self.trace_id:
+                tracing.tracer.record("client.wait_first_byte", self.trace_id, self.sent_at, tracing.now_us())
         elif pckttype == self.stopStreamPckt:
             self.streamstarted = False
+            if self.trace_id:
+                tracing.tracer.record("client.request", self.trace_id, self.sent_at, tracing.now_us())
         else:
             if self.streamstarted:
                 self.addToStream(message.decode())
 
-    def generate_response(self, query: str):
-        payload = json.dumps(self.profile).encode() + DATA_SPLITTER + query.encode()
+    def generate_response(self, query: str, trace_id: str = None):
+        self.trace_id = trace_id or tracing.new_trace_id()
+        self.sent_at = tracing.now_us()
+        payload = json.dumps({"token": self.token}).encode() + DATA_SPLITTER + query.encode() + DATA_SPLITTER + self.trace_id.encode()
+        tracing.tracer.flow_start(self.trace_id)
         self.sclient.send(payload)
+        tracing.tracer.record("client.send", self.trace_id, self.sent_at, tracing.now_us())
 
 class profilesServerSide:
-    def __init__(self):
-        self.sserver = listeners.createListener(PROFL_PORT)
+    def __init__(self, profiles: profilecache.ProfileCache = None, hasher: passwords.PasswordHasher = None, signer: sessions.SessionSigner = None):
+        self.profiles = profiles or profilecache.ProfileCache()
+        self.hasher = hasher or passwords.PasswordHasher()
+        self.sessions = signer or sessions.SessionSigner(sessions.load_secret(env.get('sessionsecret')))
+        self.sserver = listeners.createListener(PROFL_PORT, "profl", framed=True)
 
         self.logInPcktType = 2
         self.logInAcceptPckt = 5
         self.errorPcktType = 4
         self.signupFinishedPcktType = 6
+        self.resumePcktType = 7
+        self.notModifiedPcktType = 8
+        self.updatePcktType = 9
+        self.updateAcceptPcktType = 10
+        self.updateConflictPcktType = 11
+
+        self.onprofileupdated = lambda username, profile:None
 
         self.sserver.onopen = self.onopen
         self.sserver.onmessage = self.onmessage
@@ -136,77 +282,133 @@ class profilesServerSide:
         print("[+] PROFL Service: "+text)
 
     def onAttemptLogIn(self, conn: socket.socket, username, password):
-        profile_path = os.path.join("user_profiles", f"{username}.json")
-        if os.path.exists(profile_path):
-            with open(profile_path)as f:
-                profile = json.loads(f.read())
-                if hashlib.sha256(password.encode()).hexdigest() == profile["credentials"]["password"]:
-                    conn.send(bytearray([self.logInAcceptPckt])+json.dumps(profile).encode())
-                else:
-                    conn.send(bytearray([self.errorPcktType])+b"Invalid password")
+        found = self.profiles.lookup(username)
+        if found:
+            profile, version = found
+            try:
+                valid, rehashed = self.hasher.verify(password, profile["credentials"]["password"], conn.getpeername()[0])
+            except passwords.HasherBusy as e:
+                PROFL_LOGINS.labels("busy").inc()
+                sockcomm.send_frame(conn, bytearray([self.errorPcktType])+str(e).encode())
+                return
+            if valid:
+                if rehashed:
+                    # Legacy sha256 record (or an old work factor): upgrade it now that we know the password
+                    profile = dict(profile, credentials=dict(profile["credentials"], password=rehashed))
+                    # The write bumps the version; if someone else got there first the old one stands
+                    version = self.profiles.put(username, profile, version) or version
+                PROFL_LOGINS.labels("accepted").inc()
+                self.sendProfile(conn, username, profile, version)
+            else:
+                PROFL_LOGINS.labels("invalid_password").inc()
+                sockcomm.send_frame(conn, bytearray([self.errorPcktType])+b"Invalid password")
+        else:
+            PROFL_LOGINS.labels("unknown_user").inc()
+            sockcomm.send_frame(conn, bytearray([self.errorPcktType])+b"Profile does not exist. Please create a profile first.")
+
+    def sendProfile(self, conn: socket.socket, username, profile, version):
+        sockcomm.send_frame(conn, bytearray([self.logInAcceptPckt])+json.dumps({
+            "profile": public_profile(profile),
+            "token": self.sessions.issue(username),
+            "version": version
+        }).encode())
+
+    def onResume(self, conn: socket.socket, token, version):
+        username = self.sessions.verify(token) if isinstance(token, str) else None
+        found = self.profiles.lookup(username) if username else None
+        if not found:
+            PROFL_RESUMES.labels("rejected").inc()
+            sockcomm.send_frame(conn, bytearray([self.errorPcktType])+b"Your session has expired. Please log in again.")
+        elif found[1] == version:
+            PROFL_RESUMES.labels("not_modified").inc()
+            sockcomm.send_frame(conn, bytearray([self.notModifiedPcktType])+json.dumps({"token": self.sessions.issue(username)}).encode())
         else:
-            conn.send(bytearray([self.errorPcktType])+b"Profile does not exist. Please create a profile first.")
+            PROFL_RESUMES.labels("modified").inc()
+            self.sendProfile(conn, username, found[0], found[1])
+
+    def sendConflict(self, conn: socket.socket, username):
+        found = self.profiles.lookup(username)
+        PROFL_UPDATES.labels("conflict").inc()
+        sockcomm.send_frame(conn, bytearray([self.updateConflictPcktType])+json.dumps({
+            "profile": public_profile(found[0]) if found else None,
+            "version": found[1] if found else None
+        }).encode())
+
+    def onUpdate(self, conn: socket.socket, token, version, patch):
+        username = self.sessions.verify(token) if isinstance(token, str) else None
+        found = self.profiles.lookup(username) if username else None
+        if not found:
+            PROFL_UPDATES.labels("rejected").inc()
+            sockcomm.send_frame(conn, bytearray([self.errorPcktType])+b"Your session has expired. Please log in again.")
+            return
+        profile, current = found
+        if current != version:
+            self.sendConflict(conn, username)
+            return
+        try:
+            if "credentials" in profilepatch.touched_sections(patch):
+                raise profilepatch.PatchError("Credentials cannot be changed with a profile update")
+            updated = profilepatch.apply_patch(profile, patch)
+        except profilepatch.PatchError as e:
+            PROFL_UPDATES.labels("invalid").inc()
+            sockcomm.send_frame(conn, bytearray([self.errorPcktType])+f"Invalid update: {e}".encode())
+            return
+        error = profileschema.validate(updated)
+        if error:
+            PROFL_UPDATES.labels("invalid").inc()
+            sockcomm.send_frame(conn, bytearray([self.errorPcktType])+f"Invalid profile: {profileschema.format_error(error)}".encode())
+            return
+        # The store only applies the write if nobody else bumped the version in between
+        new_version = self.profiles.put(username, updated, version)
+        if new_version is None:
+            self.sendConflict(conn, username)
+            return
+        PROFL_UPDATES.labels("applied").inc()
+        sockcomm.send_frame(conn, bytearray([self.updateAcceptPcktType])+json.dumps({"version": new_version}).encode())
+        self.onprofileupdated(username, updated)
 
     def onSignUp(self, conn: socket.socket, profile):
-        profile_path = os.path.join("user_profiles", f"{profile['credentials']['username']}.json")
-        if os.path.exists(profile_path):
-            conn.send(bytearray([self.errorPcktType])+b"Username is taken")
+        if not self.profiles.create(profile['credentials']['username'], profile):
+            PROFL_SIGNUPS.labels("taken").inc()
+            sockcomm.send_frame(conn, bytearray([self.errorPcktType])+b"Username is taken")
         else:
-            with open(profile_path, "w+")as f:
-                profile2 = copy.copy(profile)
-                profile2["credentials"] = {
-                    "username" : profile2["credentials"]["username"],
-                    "password" : profile2["credentials"]["passwordhash"]
-                }
-                f.write(json.dumps(profile))
-                conn.send(bytearray([self.signupFinishedPcktType]))
-                
+            PROFL_SIGNUPS.labels("created").inc()
+            sockcomm.send_frame(conn, bytearray([self.signupFinishedPcktType]))
 
     def onopen(self, conn: socket.socket):
         self.log(f"Connection from {conn.getpeername()}")
 
     def onmessage(self, conn: socket.socket, data: bytes):
-            logging_in = data[0] == self.logInPcktType
+            pckttype = data[0]
             data = json.loads(data[1:])
-            if not logging_in:
-                required_keys = {
-                    "credentials": ['username", "password'],
-                    "general": ['first_name", "last_name", "gender", "dob'],
-                    "diagnosis": ['autism_type", "communication_styles'],
-                    "calming": ['image_themes", "sound_themes", "techniques'],
-                    "triggers": ['anxieties", "sensitivities'],
-                    "emergency": ['primary_contact_name", "relationship", "phone", "gps']
-                }
-
-                # Check all top-level keys exist
-                if not all(key in data for key in required_keys):
-                    conn.send(bytearray([self.errorPcktType])+b"Invalid profile")
-
-                # Check all subkeys exist
-                for section, subkeys in required_keys.items():
-                    if not isinstance(data[section], dict):
-                        conn.send(bytearray([self.errorPcktType])+b"Invalid profile")
-                    for subkey in subkeys:
-                        if subkey not in data[section]:
-                            conn.send(bytearray([self.errorPcktType])+b"Invalid profile")
-
-                if not isinstance(data['diagnosis']['communication_styles'], list):
-                    conn.send(bytearray([self.errorPcktType])+b"Invalid profile")
-                if not isinstance(data['calming']['image_themes'], list):
-                    conn.send(bytearray([self.errorPcktType])+b"Invalid profile")
-                if not isinstance(data['calming']['sound_themes'], list):
-                    conn.send(bytearray([self.errorPcktType])+b"Invalid profile")
-                if not isinstance(data['triggers']['anxieties'], list):
-                    conn.send(bytearray([self.errorPcktType])+b"Invalid profile")
-                data['credentials']['passwordhash'] = hashlib.sha256(data['credentials']['password'].encode()).hexdigest()
-                self.onSignUp(conn, data)
+            if pckttype == self.resumePcktType:
+                with PROFL_LATENCY.labels("resume").time():
+                    self.onResume(conn, data.get("token"), data.get("version"))
+            elif pckttype == self.updatePcktType:
+                with PROFL_LATENCY.labels("update").time():
+                    self.onUpdate(conn, data.get("token"), data.get("version"), data.get("patch"))
+            elif pckttype != self.logInPcktType:
+                error = profileschema.validate(data)
+                if error:
+                    PROFL_SIGNUPS.labels("invalid").inc()
+                    sockcomm.send_frame(conn, bytearray([self.errorPcktType])+f"Invalid profile: {profileschema.format_error(error)}".encode())
+                    return
+                try:
+                    data['credentials']['password'] = self.hasher.hash(data['credentials']['password'], conn.getpeername()[0])
+                except passwords.HasherBusy as e:
+                    PROFL_SIGNUPS.labels("busy").inc()
+                    sockcomm.send_frame(conn, bytearray([self.errorPcktType])+str(e).encode())
+                    return
+                with PROFL_LATENCY.labels("signup").time():
+                    self.onSignUp(conn, data)
             else:
-                if (not "username" in data) or (not "password" in data):
+                if profileschema.validate_login(data):
                     self.log(f"{conn.getpeername()}: Login attempt: did not provide credentials")
-                    conn.send(bytearray([self.errorPcktType])+b"Please provide username and password")
+                    sockcomm.send_frame(conn, bytearray([self.errorPcktType])+b"Please provide username and password")
                 else:
-                    self.log(f"{conn.getpeername()}: Login attempt: USER = {data['username']}, PWD = {data['password']}")
-                    self.onAttemptLogIn(conn, data['username'], data['password'])
+                    self.log(f"{conn.getpeername()}: Login attempt: USER = {data['username']}")
+                    with PROFL_LATENCY.labels("login").time():
+                        self.onAttemptLogIn(conn, data['username'], data['password'])
 
     def onclose(self, addr):
         self.log(f"{addr}: Connection closed")
@@ -216,16 +418,27 @@ class profilesServerSide:
 
 class profilesClientSide:
     def __init__(self, host):
-        self.sclient = listeners.connectToListener(host, PROFL_PORT)
+        self.sclient = listeners.connectToListener(host, PROFL_PORT, framed=True)
         self.logInPcktType = 2
         self.signUpPcktType = 3
         self.errorPcktType = 4
         self.logInAcceptPcktType = 5
         self.signupFinishedPcktType = 6
+        self.resumePcktType = 7
+        self.notModifiedPcktType = 8
+        self.updatePcktType = 9
+        self.updateAcceptPcktType = 10
+        self.updateConflictPcktType = 11
 
         self.sclient.onmessage = self.onmessage
 
+        self.token = None
+        self.version = None
+
         self.onGotProfile = lambda profile:None
+        self.onNotModified = lambda:None
+        self.onProfileUpdated = lambda version:None
+        self.onUpdateConflict = lambda profile, version:None
         self.onSignupSuccess = lambda:None
         self.onClientError = lambda error:None
 
@@ -236,26 +449,103 @@ class profilesClientSide:
         if data[0] == self.errorPcktType:
             self.onClientError(data[1:].decode())
         elif data[0] == self.logInAcceptPcktType:
-            self.onGotProfile(json.loads(data[1:]))
+            response = json.loads(data[1:])
+            self.token = response["token"]
+            self.version = response["version"]
+            self.onGotProfile(response["profile"])
+        elif data[0] == self.notModifiedPcktType:
+            self.token = json.loads(data[1:])["token"]
+            self.onNotModified()
+        elif data[0] == self.updateAcceptPcktType:
+            self.version = json.loads(data[1:])["version"]
+            self.onProfileUpdated(self.version)
+        elif data[0] == self.updateConflictPcktType:
+            response = json.loads(data[1:])
+            self.version = response["version"]
+            self.onUpdateConflict(response["profile"], response["version"])
         elif data[0] == self.signupFinishedPcktType:
             self.onSignupSuccess()
 
     def log_in(self, username, password):
         self.sclient.send(bytearray([self.logInPcktType])+json.dumps({"username":username,"password":password}).encode())
 
+    def resume(self, token, version):
+        self.sclient.send(bytearray([self.resumePcktType])+json.dumps({"token":token,"version":version}).encode())
+
+    def update_profile(self, token, version, patch: list):
+        self.sclient.send(bytearray([self.updatePcktType])+json.dumps({"token":token,"version":version,"patch":patch}).encode())
+
     def sign_up(self, profile):
         self.sclient.send(bytearray([self.signUpPcktType])+json.dumps(profile).encode())
 
 
+class AudioUpload:
+    def __init__(self, upload_id: bytes, size: int, meta: dict):
+        self.id = upload_id
+        self.size = size
+        self.meta = meta
+        self.trace_id = meta.get("trace") or tracing.new_trace_id()
+        # Recordings are assembled in memory; streamed ones arrive as raw or encoded PCM and are
+        # decoded into a WAV as they are written
+        self.buffer = io.BytesIO()
+        fmt = meta.get("format")
+        if fmt in audiocodec.FORMATS:
+            self.wav = wave.open(self.buffer, "wb")
+            self.wav.setnchannels(meta.get("channels", 1))
+            self.wav.setsampwidth(2)
+            self.wav.setframerate(meta.get("rate", 16000))
+            self.writedata = lambda data: self.wav.writeframesraw(audiocodec.decode(data, fmt))
+        else:
+            self.wav = None
+            self.writedata = self.buffer.write
+        self.received = 0
+        self.nextseq = 0
+        self.started = tracing.now_us()
+        self.user = None
+
+    def write(self, seq: int, data: bytes):
+        if seq != self.nextseq:
+            raise ValueError(f"Expected chunk {self.nextseq}, got {seq}")
+        if self.received+len(data) > (self.size or AUDIO_MAX_UPLOAD):
+            raise ValueError("Upload is larger than announced")
+        self.writedata(data)
+        self.received += len(data)
+        self.nextseq += 1
+
+    def finish(self, total: int):
+        if self.wav:
+            self.wav.close()
+        if total != self.received or (self.size and total != self.size):
+            raise ValueError(f"Upload incomplete: got {self.received} of {total} bytes")
+        self.buffer.seek(0)
+        return self.buffer
+
+    def discard(self):
+        if self.wav:
+            self.wav.close()
+        self.buffer.close()
+
 class audioDescServerSide:
-    def __init__(self, llmss):
+    def __init__(self, llmss, signer: sessions.SessionSigner = None):
         self.llmss = llmss
-        self.sserver = listeners.createListener(AUDESC_PORT)
+        self.sessions = signer or sessions.SessionSigner(sessions.load_secret(env.get('sessionsecret')))
+        self.sserver = listeners.createListener(AUDESC_PORT, "audesc", framed=True, max_frame=AUDIO_MAX_FRAME)
 
-        self.describeRequest = 2
+        self.uploadStartPckt = 2
         self.describeResponse = 3
-
-        self.recieving = False
+        self.uploadChunkPckt = 4
+        self.uploadEndPckt = 5
+        self.chunkAckPckt = 6
+        self.uploadErrorPckt = 7
+        self.answerStartPckt = 8
+        self.answerPartPckt = 9
+        self.answerEndPckt = 10
+
+        # One upload session per connection, so concurrent recordings never share state
+        self.uploads: dict[socket.socket, AudioUpload] = {}
+        self.lock = threading.Lock()
+        # In single-pass mode the description and the answer are sent from different threads
+        self.sendlock = threading.Lock()
 
         self.sserver.onopen = self.onopen
         self.sserver.onmessage = self.onmessage
@@ -271,30 +561,133 @@ class audioDescServerSide:
     def onopen(self, conn: socket.socket):
         self.log(f"Connection from {conn.getpeername()}")
 
+    def send(self, conn: socket.socket, pckttype: int, data: bytes = b""):
+        with self.sendlock:
+            sockcomm.send_frame(conn, bytes([pckttype])+data)
+
+    def sendError(self, conn: socket.socket, upload_id: bytes, error: str):
+        self.send(conn, self.uploadErrorPckt, upload_id+error.encode())
+
+    def takeUpload(self, conn: socket.socket):
+        with self.lock:
+            return self.uploads.pop(conn, None)
+
+    def onUploadStart(self, conn: socket.socket, data: bytes):
+        previous = self.takeUpload(conn)
+        if previous:
+            previous.discard()
+        upload_id = data[1:5]
+        size = int.from_bytes(data[5:13], "big")
+        try:
+            meta = json.loads(data[13:]) if len(data) > 13 else {}
+        except ValueError:
+            meta = None
+        if not isinstance(meta, dict):
+            self.sendError(conn, upload_id, "Invalid upload metadata")
+            return
+        if size > AUDIO_MAX_UPLOAD:
+            self.sendError(conn, upload_id, "Recording is too large")
+            return
+        upload = AudioUpload(upload_id, size, meta)
+        if meta.get("answer"):
+            # Answers go into the user's chat, so the user comes from their session token
+            token = meta.get("token")
+            upload.user = self.sessions.verify(token) if isinstance(token, str) else None
+            if not upload.user:
+                upload.discard()
+                self.sendError(conn, upload_id, "Your session has expired. Please log in again.")
+                return
+        tracing.tracer.flow_end(upload.trace_id)
+        with self.lock:
+            self.uploads[conn] = upload
+
+    # Chunks still in flight when an upload failed keep their upload id, so the errors
+    # they get back are not mistaken for errors of the client's next upload
+    def onUploadChunk(self, conn: socket.socket, data: bytes):
+        upload_id = data[1:5]
+        upload = self.uploads.get(conn)
+        if upload is None or upload.id != upload_id:
+            self.sendError(conn, upload_id, "No upload in progress")
+            return
+        seq = int.from_bytes(data[5:9], "big")
+        try:
+            upload.write(seq, data[9:])
+        except ValueError as e:
+            self.takeUpload(conn)
+            upload.discard()
+            self.sendError(conn, upload_id, str(e))
+            return
+        AUDESC_UPLOAD_BYTES.inc(len(data)-9)
+        self.send(conn, self.chunkAckPckt, data[1:9])
+
+    def onUploadEnd(self, conn: socket.socket, data: bytes):
+        upload_id = data[1:5]
+        with self.lock:
+            upload = self.uploads.get(conn)
+            if upload is not None and upload.id == upload_id:
+                del self.uploads[conn]
+            else:
+                upload = None
+        if upload is None:
+            self.sendError(conn, upload_id, "No upload in progress")
+            return
+        try:
+            audio = upload.finish(int.from_bytes(data[5:13], "big"))
+            tracing.tracer.record("audesc.upload", upload.trace_id, upload.started, tracing.now_us(), bytes=upload.received)
+            AUDESC_UPLOAD_SIZE.observe(upload.received)
+            if upload.meta.get("answer"):
+                self.answerAudio(conn, upload, audio.getvalue())
+            else:
+                self.send(conn, self.describeResponse, self.describe(audio, upload.trace_id).encode())
+        except ValueError as e:
+            self.sendError(conn, upload_id, str(e))
+        finally:
+            upload.discard()
+
+    def describe(self, audio, trace_id: str):
+        with AUDESC_DESCRIBE.time(), tracing.tracer.span("audesc.describe", trace_id):
+            return audioparser.describe(self.llmss.studio, audio)
+
+    # Single-pass mode: the recording goes into the chat as part of the user turn and the
+    # answer streams back on this connection, while the description is produced alongside
+    # for display. Once both are done the audio in the chat history is replaced by the
+    # description, so later prompts do not resend it.
+    def answerAudio(self, conn: socket.socket, upload: AudioUpload, data: bytes):
+        described = {}
+        def describe():
+            try:
+                described["text"] = self.describe(io.BytesIO(data), upload.trace_id)
+                self.send(conn, self.describeResponse, described["text"].encode())
+            except Exception as e:
+                self.log(f"Describing {upload.trace_id} failed: {e}")
+        describer = threading.Thread(target=describe, daemon=True)
+        describer.start()
+
+        host, port = conn.getpeername()[:2]
+        chat, turn = self.llmss.answer(
+            upload.user, VOICE_PROMPT, upload.trace_id, f"{host}:{port}",
+            send = lambda text: self.send(conn, self.answerPartPckt, text.encode()),
+            begin = lambda: self.send(conn, self.answerStartPckt),
+            parts = [aistudio.audio_part(data)]
+        )
+        self.send(conn, self.answerEndPckt)
+        describer.join()
+        if "text" in described:
+            chat.replace_turn(turn, voice_query(described["text"]))
+
     def onmessage(self, conn: socket.socket, data: bytes):
-        self.log(f"{conn.getpeername()}: Got data")
-        isRequest = data[0] == self.describeRequest
-        if isRequest:
-            self.tmpfile = tempfile.mktemp(".wav", "tmp", tempfile.gettempdir())
-            s = data.split(DATA_SPLITTER)
-            self.length = s[0]
-            self.recieving = True
-            self.recieved = 0
-            with open(self.tmpfile, "wb") as f:
-                f.write(s[1])
-                self.length += len(s[1])
-        else:
-            if self.recieved >= self.length:
-                self.recieving = False
-                self.recieved = 0
-                conn.send(bytearray([self.describeResponse])+audioparser.describe(self.llmss.studio, self.tmpfile))
-                print("Sent description")
-            if self.recieving:
-                with open(self.tmpfile, "ab") as f:
-                    f.write(data)
-                    self.length += 1024
+        pckttype = data[0]
+        if pckttype == self.uploadStartPckt:
+            self.onUploadStart(conn, data)
+        elif pckttype == self.uploadChunkPckt:
+            self.onUploadChunk(conn, data)
+        elif pckttype == self.uploadEndPckt:
+            self.onUploadEnd(conn, data)
 
     def onclose(self, addr):
+        upload = self.takeUpload(addr)
+        if upload:
+            upload.discard()
         self.log(f"{addr}: Connection closed")
 
     def onerror(self, conn: socket.socket, e: Exception):
@@ -303,9 +696,30 @@ class audioDescServerSide:
 class audioDescClientSide:
     def __init__(self, host):
 
-        self.sclient = listeners.connectToListener(host, AUDESC_PORT)
-        self.describeRequest = 2
+        self.sclient = listeners.connectToListener(host, AUDESC_PORT, framed=True)
+        self.uploadStartPckt = 2
         self.describeResponse = 3
+        self.uploadChunkPckt = 4
+        self.uploadEndPckt = 5
+        self.chunkAckPckt = 6
+        self.uploadErrorPckt = 7
+        self.answerStartPckt = 8
+        self.answerPartPckt = 9
+        self.answerEndPckt = 10
+
+        self.onAnswerStart = lambda:None
+        self.onAnswerPart = lambda text:None
+        self.onAnswerEnd = lambda:None
+
+        # Up to AUDIO_WINDOW chunks may be unacknowledged, which keeps the link busy
+        # without letting a slow server buffer the whole recording in the socket
+        self.acks = threading.Condition()
+        self.inflight = 0
+        self.uploadlock = threading.Lock()
+        # Set by the first error of an upload; the rest of it is not sent. Acks and errors
+        # carry the id of the upload they belong to, anything for an older one is ignored.
+        self.failed = False
+        self.uploadid = 0
 
         self.sclient.onmessage = self.onmessage
 
@@ -315,11 +729,274 @@ class audioDescClientSide:
     def gotAudioDescription(self, description: str):
         pass
 
+    def onUploadError(self, error: str):
+        pass
+
     def onmessage(self, conn: socket.socket, data: bytes):
-        isResponse = data[0] == self.describeResponse
-        if isResponse:
+        pckttype = data[0]
+        if pckttype == self.chunkAckPckt:
+            with self.acks:
+                if int.from_bytes(data[1:5], "big") != self.uploadid:
+                    return
+                self.inflight = max(0, self.inflight-1)
+                self.acks.notify()
+        elif pckttype == self.describeResponse:
             self.gotAudioDescription(data[1:].decode())
-    
-    def describe(self, audiofile):
-        with open(audiofile, "rb")as f:
-            self.sclient.send(bytearray([self.describeRequest])+bytearray([len(f.read())])+DATA_SPLITTER+f.read())
\ No newline at end of file
+        elif pckttype == self.uploadErrorPckt:
+            with self.acks:
+                if int.from_bytes(data[1:5], "big") != self.uploadid:
+                    return
+                first = not self.failed
+                self.failed = True
+                self.acks.notify_all()
+            if first:
+                self.onUploadError(data[5:].decode())
+        elif pckttype == self.answerStartPckt:
+            self.onAnswerStart()
+        elif pckttype == self.answerPartPckt:
+            self.onAnswerPart(data[1:].decode())
+        elif pckttype == self.answerEndPckt:
+            self.onAnswerEnd()
+
+    def waitForWindow(self):
+        with self.acks:
+            if not self.acks.wait_for(lambda: self.inflight < AUDIO_WINDOW or self.failed or not self.sclient.running, timeout=30):
+                return False
+            self.inflight += 1
+            return self.sclient.running and not self.failed
+
+    def startUpload(self, size: int, meta: dict):
+        with self.acks:
+            self.uploadid = (self.uploadid+1) % 2**32
+            self.inflight = 0
+            self.failed = False
+        self.sclient.send(bytes([self.uploadStartPckt])+self.uploadid.to_bytes(4, "big")+size.to_bytes(8, "big")+json.dumps(meta).encode())
+
+    def sendChunk(self, seq: int, data: bytes):
+        if not self.waitForWindow():
+            if not self.failed:
+                self.onUploadError("Upload timed out")
+            return False
+        self.sclient.send(bytes([self.uploadChunkPckt])+self.uploadid.to_bytes(4, "big")+seq.to_bytes(4, "big")+data)
+        return True
+
+    def endUpload(self, total: int):
+        self.sclient.send(bytes([self.uploadEndPckt])+self.uploadid.to_bytes(4, "big")+total.to_bytes(8, "big"))
+
+    def upload(self, data: bytes, meta: dict):
+        with self.uploadlock:
+            self.startUpload(len(data), meta)
+            for seq, offset in enumerate(range(0, len(data), AUDIO_CHUNK_SIZE)):
+                if not self.sendChunk(seq, data[offset:offset+AUDIO_CHUNK_SIZE]):
+                    return
+            self.endUpload(len(data))
+
+    # With answer_token (a session token) set, the server answers the recording directly for
+    # that user (single-pass mode) and the description only arrives for display
+    def begin_stream(self, trace_id: str = None, rate: int = 16000, fmt: str = "pcm16", upload_rate: int = None, answer_token: str = None):
+        meta = {"answer": True, "token": answer_token} if answer_token else None
+        return AudioStream(self, trace_id or tracing.new_trace_id(), audiocodec.Encoder(fmt, rate, upload_rate), meta)
+
+    def describe(self, audio, trace_id: str = None):
+        trace_id = trace_id or tracing.new_trace_id()
+        if isinstance(audio, (bytes, bytearray)):
+            data = bytes(audio)
+        else:
+            with open(audio, "rb")as f:
+                data = f.read()
+        def run():
+            tracing.tracer.flow_start(trace_id)
+            with tracing.tracer.span("client.audio_upload", trace_id, bytes=len(data)):
+                self.upload(data, {"trace": trace_id, "format": "wav"})
+        threading.Thread(target=run, daemon=True).start()
+
+# Uploads PCM while it is being recorded. push() never blocks, so it is safe to call from
+# the recorder thread; whatever piled up while waiting for acks is sent as one chunk.
+class AudioStream:
+    def __init__(self, client: audioDescClientSide, trace_id: str, encoder: audiocodec.Encoder, meta: dict = None):
+        self.client = client
+        self.trace_id = trace_id
+        self.encoder = encoder
+        self.meta = dict(encoder.meta, trace=trace_id, **(meta or {}))
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def push(self, data: bytes):
+        self.queue.put(data)
+
+    def end(self):
+        self.queue.put(None)
+
+    def collect(self):
+        parts = [self.queue.get()]
+        size = len(parts[0] or b"")
+        while parts[-1] is not None and size < AUDIO_CHUNK_SIZE:
+            try:
+                parts.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            size += len(parts[-1] or b"")
+        return self.encoder.encode(b"".join(part for part in parts if part)), parts[-1] is None
+
+    def run(self):
+        tracing.tracer.flow_start(self.trace_id)
+        with self.client.uploadlock, tracing.tracer.span("client.audio_stream", self.trace_id):
+            self.client.startUpload(0, self.meta)
+            seq = total = 0
+            done = False
+            while not done:
+                data, done = self.collect()
+                # Whatever piled up is still sent in chunks of at most AUDIO_CHUNK_SIZE
+                for offset in range(0, len(data), AUDIO_CHUNK_SIZE):
+                    if not self.client.sendChunk(seq, data[offset:offset+AUDIO_CHUNK_SIZE]):
+                        return
+                    seq += 1
+                total += len(data)
+            self.client.endUpload(total)
+
+# Frames travel as JPEG with a request id; detections come back for that id packed with
+# packages.detections. Class names are sent once per connection. OpenCV and the model
+# are only imported by the vision classes, so the other services don't need them.
+class visionServerSide:
+    def __init__(self):
+        self.sserver = listeners.createListener(VISION_PORT, "vision", framed=True)
+
+        self.detectPckt = 2
+        self.detectionsPckt = 3
+        self.errorPckt = 4
+        self.classesPckt = 5
+        self.masksFlag = 1
+        self.loaded = False
+
+        # One model per host, shared by every connection. Frames arriving together from
+        # different connections are run through the model as one batch.
+        self.batcher = batching.MicroBatcher(self.predict, config.VISION_MAX_BATCH, config.VISION_MAX_WAIT_MS, "vision")
+
+        self.sserver.onopen = self.onopen
+        self.sserver.onmessage = self.onmessage
+        self.sserver.onclose = self.onclose
+        self.sserver.onerror = self.onerror
+
+    def load(self):
+        import packages.image as image
+        self.log("Loading model")
+        image.load()
+        image.warmup()
+        self.loaded = True
+        self.log("Model ready")
+
+    def start(self):
+        if not self.loaded:
+            self.load()
+        self.sserver.start()
+
+    def log(self, text: str):
+        print("[+] VISION Service: "+text)
+
+    def predict(self, frames: list):
+        import packages.image as image
+        with VISION_INFERENCE.time():
+            return image.predict_batch(frames)
+
+    def onopen(self, conn: socket.socket):
+        import packages.image as image
+        self.log(f"Connection from {conn.getpeername()}")
+        sockcomm.send_frame(conn, bytes([self.classesPckt])+json.dumps(image.class_names()).encode())
+
+    def onmessage(self, conn: socket.socket, data: bytes):
+        import cv2
+        import numpy as np
+        import packages.detections as detections
+        if data[0] != self.detectPckt:
+            return
+        request_id = data[1:5]
+        trace_id = data[5:21].decode().strip() or tracing.new_trace_id()
+        flags = data[21]
+        tracing.tracer.flow_end(trace_id)
+        VISION_FRAME_SIZE.observe(len(data)-22)
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8, offset=22), cv2.IMREAD_COLOR)
+        if frame is None:
+            VISION_REQUESTS.labels("invalid").inc()
+            sockcomm.send_frame(conn, bytes([self.errorPckt])+request_id+b"Invalid image")
+            return
+        with tracing.tracer.span("vision.predict", trace_id):
+            predictions = self.batcher(frame)
+        result = detections.from_instances(predictions["instances"], masks=bool(flags & self.masksFlag))
+        VISION_REQUESTS.labels("ok").inc()
+        sockcomm.send_frame(conn, bytes([self.detectionsPckt])+request_id+detections.pack(result))
+
+    def onclose(self, addr):
+        self.log(f"{addr}: Connection closed")
+
+    def onerror(self, conn: socket.socket, e: Exception):
+        self.log(f"{conn.getpeername()}: Exception in connection: {e}")
+
+class visionClientSide:
+    def __init__(self, host, quality: int = 80):
+        self.sclient = listeners.connectToListener(host, VISION_PORT, framed=True)
+        self.detectPckt = 2
+        self.detectionsPckt = 3
+        self.errorPckt = 4
+        self.classesPckt = 5
+        self.masksFlag = 1
+        self.classes = []
+        self.quality = quality
+        self.nextid = 0
+        self.pending: dict[int, concurrent.futures.Future] = {}
+        self.lock = threading.Lock()
+
+        self.onDetections = lambda request_id, detections:None
+        self.onError = lambda request_id, error:None
+
+        self.sclient.onmessage = self.onmessage
+
+        if not self.sclient.running:
+            raise Exception("Server is offline")
+
+    # Detections arrive as a packages.detections result with "names" added for its classes
+    def onmessage(self, conn: socket.socket, data: bytes):
+        import packages.detections as detections
+        pckttype = data[0]
+        if pckttype == self.classesPckt:
+            self.classes = json.loads(data[1:])
+            return
+        request_id = int.from_bytes(data[1:5], "big")
+        with self.lock:
+            future = self.pending.pop(request_id, None)
+        if pckttype == self.detectionsPckt:
+            result = detections.unpack(data[5:])
+            result["names"] = [self.classes[c] if c < len(self.classes) else str(c) for c in result["classes"].tolist()]
+            if future:
+                future.set_result(result)
+            self.onDetections(request_id, result)
+        elif pckttype == self.errorPckt:
+            if future:
+                future.set_exception(ValueError(data[5:].decode()))
+            self.onError(request_id, data[5:].decode())
+
+    # Sends a BGR frame for detection and returns the id its onDetections call will carry
+    def detect(self, frame, trace_id: str = None, future: concurrent.futures.Future = None, masks: bool = False):
+        import cv2
+        trace_id = trace_id or tracing.new_trace_id()
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("Could not encode frame")
+        with self.lock:
+            self.nextid = (self.nextid+1) % 2**32
+            request_id = self.nextid
+            if future:
+                self.pending[request_id] = future
+        tracing.tracer.flow_start(trace_id)
+        self.sclient.send(bytes([self.detectPckt])+request_id.to_bytes(4, "big")+trace_id.encode().ljust(16)[:16]+bytes([self.masksFlag if masks else 0])+jpeg.tobytes())
+        return request_id
+
+    # Blocking form of detect, e.g. as the predict function of a framesampler.FrameSampler
+    def predict(self, frame, timeout: float = 10, masks: bool = False):
+        future = concurrent.futures.Future()
+        request_id = self.detect(frame, future=future, masks=masks)
+        try:
+            return future.result(timeout)
+        finally:
+            with self.lock:
+                self.pending.pop(request_id, None)
@@ -0,0 +1,126 @@
+import struct
+
+import numpy as np
+
+# Compact detection results. In memory a result is a dict of NumPy arrays:
+#   {"size": (height, width), "boxes": int16 (n, 4) x0 y0 x1 y1, "classes": uint8 (n,),
+#    "scores": float32 (n,), "masks": list of COCO compressed RLE strings, or None}
+# pack()/unpack() turn it into bytes: a header, one fixed-size record per detection and the
+# RLE strings, which is what the vision service sends and what callers can cache.
+
+MAGIC = b"DET1"
+HEADER = struct.Struct("<4sHHH")
+RECORD = np.dtype([("box", "<i2", (4,)), ("cls", "u1"), ("score", "<u2"), ("rle", "<u4")])
+
+# COCO RLE: run lengths over the column-major flattened mask, starting with a run of zeros
+def rle_counts(mask: np.ndarray):
+    flat = np.asarray(mask, dtype=bool).ravel(order="F")
+    if not len(flat):
+        return np.zeros(0, dtype=np.int64)
+    edges = np.flatnonzero(flat[1:] != flat[:-1])+1
+    counts = np.diff(np.concatenate([[0], edges, [len(flat)]]))
+    return np.concatenate([[0], counts]) if flat[0] else counts
+
+def counts_to_mask(counts, height: int, width: int):
+    values = np.arange(len(counts)) % 2 == 1
+    return np.repeat(values, counts).reshape((height, width), order="F")
+
+# The string form used by pycocotools (rleToString): deltas against the run two back,
+# 5 bits per character
+def counts_to_string(counts):
+    out = []
+    for i, x in enumerate(int(c) for c in counts):
+        if i > 2:
+            x -= int(counts[i-2])
+        more = True
+        while more:
+            c = x & 0x1f
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            out.append(chr(c+48))
+    return "".join(out)
+
+def string_to_counts(text: str):
+    counts = []
+    p = 0
+    while p < len(text):
+        x = k = 0
+        more = True
+        while more:
+            c = ord(text[p])-48
+            x |= (c & 0x1f) << 5*k
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << 5*k
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return np.array(counts, dtype=np.int64)
+
+def encode_mask(mask: np.ndarray):
+    return counts_to_string(rle_counts(mask))
+
+def decode_mask(text: str, height: int, width: int):
+    return counts_to_mask(string_to_counts(text), height, width)
+
+def from_instances(instances, masks: bool = True):
+    instances = instances.to("cpu")
+    height, width = instances.image_size
+    result = {
+        "size": (height, width),
+        "boxes": np.clip(np.rint(instances.pred_boxes.tensor.numpy()), -32768, 32767).astype(np.int16),
+        "classes": instances.pred_classes.numpy().astype(np.uint8),
+        "scores": instances.scores.numpy().astype(np.float32),
+        "masks": None,
+    }
+    if masks and instances.has("pred_masks"):
+        result["masks"] = [encode_mask(mask) for mask in instances.pred_masks.numpy()]
+    return result
+
+def pack(result: dict):
+    count = len(result["classes"])
+    records = np.zeros(count, dtype=RECORD)
+    records["box"] = result["boxes"]
+    records["cls"] = result["classes"]
+    records["score"] = np.rint(np.clip(result["scores"], 0, 1)*65535)
+    masks = [text.encode() for text in result["masks"]] if result["masks"] is not None else []
+    if masks:
+        records["rle"] = [len(mask) for mask in masks]
+    height, width = result["size"]
+    return HEADER.pack(MAGIC, count, height, width)+records.tobytes()+b"".join(masks)
+
+def unpack(data: bytes):
+    magic, count, height, width = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a packed detection result")
+    records = np.frombuffer(data, dtype=RECORD, count=count, offset=HEADER.size)
+    offset = HEADER.size+records.nbytes
+    masks = None
+    if count and records["rle"].any():
+        masks = []
+        for length in records["rle"].tolist():
+            masks.append(data[offset:offset+length].decode())
+            offset += length
+    return {
+        "size": (height, width),
+        "boxes": records["box"].copy(),
+        "classes": records["cls"].copy(),
+        "scores": records["score"].astype(np.float32)/65535,
+        "masks": masks,
+    }
+
+def masks(result: dict):
+    height, width = result["size"]
+    if not result["masks"]:
+        return np.zeros((0, height, width), dtype=bool)
+    return np.stack([decode_mask(text, height, width) for text in result["masks"]])
+
+def summarise(result: dict, names: list):
+    return [
+        {"class": names[c], "score": round(float(score), 3), "box": box}
+        for c, score, box in zip(result["classes"].tolist(), result["scores"], result["boxes"].tolist())
+    ]
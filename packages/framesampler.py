@@ -0,0 +1,98 @@
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Sits between the camera and the detector. Frames are taken at most `fps` times a second,
+# and a sampled frame is only sent for inference when it differs from the last inferred one:
+# by its difference hash (structure) or by its mean pixel difference (lighting, small
+# objects). Otherwise the previous predictions are reused, so inference follows scene
+# changes instead of the camera frame rate.
+
+THUMB_SIZE = 32
+
+def thumbnail(frame: np.ndarray, size: int = THUMB_SIZE):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)/255
+
+def dhash(thumb: np.ndarray, size: int = 8):
+    small = cv2.resize(thumb, (size+1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hash_distance(a: int, b: int):
+    return bin(a ^ b).count("1")
+
+def difference(a: np.ndarray, b: np.ndarray):
+    return float(np.mean(np.abs(a-b)))
+
+class FrameSampler:
+    def __init__(self, predict, fps: float = 2, hash_threshold: int = 5, diff_threshold: float = .008, max_age: float = 10):
+        self.predict = predict
+        self.interval = 1/fps if fps else 0
+        self.hash_threshold = hash_threshold
+        self.diff_threshold = diff_threshold
+        self.max_age = max_age
+        self.last_sampled = None
+        self.last_inferred = None
+        self.thumb = None
+        self.hash = None
+        self.predictions = None
+        self.stats = collections.Counter()
+
+    def changed(self, thumb: np.ndarray, frame_hash: int):
+        if self.thumb is None:
+            return True
+        return hash_distance(frame_hash, self.hash) > self.hash_threshold or difference(thumb, self.thumb) > self.diff_threshold
+
+    # Returns (predictions, fresh); fresh is False when the last predictions were reused
+    def process(self, frame: np.ndarray, now: float = None):
+        now = time.monotonic() if now is None else now
+        if self.last_sampled is not None and now-self.last_sampled < self.interval:
+            self.stats["rate"] += 1
+            return self.predictions, False
+        self.last_sampled = now
+        thumb = thumbnail(frame)
+        frame_hash = dhash(thumb)
+        if not self.changed(thumb, frame_hash) and now-self.last_inferred < self.max_age:
+            self.stats["unchanged"] += 1
+            return self.predictions, False
+        self.stats["inferred"] += 1
+        self.predictions = self.predict(frame)
+        self.thumb, self.hash, self.last_inferred = thumb, frame_hash, now
+        return self.predictions, True
+
+# Reads a camera on its own thread and hands fresh predictions to on_result(frame, predictions)
+class CameraCapture:
+    def __init__(self, sampler: FrameSampler, on_result, source=0):
+        self.sampler = sampler
+        self.on_result = on_result
+        self.source = source
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        capture = cv2.VideoCapture(self.source)
+        try:
+            while self.running:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                predictions, fresh = self.sampler.process(frame)
+                if fresh:
+                    self.on_result(frame, predictions)
+        finally:
+            capture.release()
+            self.running = False
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
@@ -1,24 +1,131 @@
+import hashlib
+import os
+import threading
+
 import cv2
-from detectron2.engine import DefaultPredictor
-from detectron2.config import get_cfg
-from detectron2 import model_zoo
-from detectron2.utils.visualizer import Visualizer
-from detectron2.data import MetadataCatalog
-
-# Setup config and model
-cfg = get_cfg()
-cfg.merge_from_file(model_zoo.get_config_file(
-    "COCO-InstanceSegmentation/mask_rcnn_R_50_FPN_3x.yaml"))
-cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.5  # set threshold
-cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url(
-    "COCO-InstanceSegmentation/mask_rcnn_R_50_FPN_3x.yaml")
-cfg.MODEL.DEVICE = "cpu"
-
-predictor = DefaultPredictor(cfg)
+import numpy as np
+
+import packages.config as config
+import packages.detections as detections
+
+# The model is built on first use (or by load() at service startup), not at import, so
+# importing this module stays cheap and only the vision service pays for the weights.
+cfg = None
+predictor = None
+lock = threading.Lock()
+
+MODEL_CONFIG = "COCO-InstanceSegmentation/mask_rcnn_R_50_FPN_3x.yaml"
+
+def build_config(light: bool = False):
+    from detectron2.config import get_cfg
+    from detectron2 import model_zoo
+
+    # Setup config and model
+    cfg = get_cfg()
+    cfg.merge_from_file(model_zoo.get_config_file(MODEL_CONFIG))
+    cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.5  # set threshold
+    cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url(MODEL_CONFIG)
+    cfg.MODEL.DEVICE = "cpu"
+    if light:
+        # Smaller input and fewer proposals: most of the CPU time is the backbone at full
+        # resolution and the ROI heads over 1000 proposals
+        cfg.INPUT.MIN_SIZE_TEST = 480
+        cfg.INPUT.MAX_SIZE_TEST = 800
+        cfg.MODEL.RPN.PRE_NMS_TOPK_TEST = 500
+        cfg.MODEL.RPN.POST_NMS_TOPK_TEST = 200
+        cfg.TEST.DETECTIONS_PER_IMAGE = 50
+    return cfg
+
+# Has what predict_batch uses from a DefaultPredictor (model, aug, input_format), so both
+# kinds run through the same batched forward pass. The model is the eager Mask R-CNN with
+# its Linear layers (the box head) quantized to dynamic int8; convolutions stay in float.
+class QuantizedPredictor:
+    def __init__(self, cfg, model):
+        import detectron2.data.transforms as T
+        self.cfg = cfg
+        self.model = model
+        self.aug = T.ResizeShortestEdge([cfg.INPUT.MIN_SIZE_TEST, cfg.INPUT.MIN_SIZE_TEST], cfg.INPUT.MAX_SIZE_TEST)
+        self.input_format = cfg.INPUT.FORMAT
+
+    def __call__(self, frame: cv2.typing.MatLike):
+        return run(self, [frame])[0]
+
+def quantized_path(cfg):
+    import torch
+    import detectron2
+    key = hashlib.sha256((cfg.dump()+torch.__version__+detectron2.__version__).encode()).hexdigest()[:16]
+    return os.path.join(config.VISION_CACHE_DIR, f"mask_rcnn-int8-{key}.pt")
+
+# The quantized model is saved whole, so later startups load it directly instead of
+# reading the float checkpoint and quantizing again
+def build_quantized(cfg):
+    import torch
+    path = quantized_path(cfg)
+    if os.path.exists(path):
+        return QuantizedPredictor(cfg, torch.load(path, weights_only=False))
+    from detectron2.checkpoint import DetectionCheckpointer
+    from detectron2.modeling import build_model
+    model = build_model(cfg)
+    DetectionCheckpointer(model).load(cfg.MODEL.WEIGHTS)
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(config.VISION_CACHE_DIR, exist_ok=True)
+    torch.save(model, path+".tmp")
+    os.replace(path+".tmp", path)
+    print("Cached quantized detection model in", path)
+    return QuantizedPredictor(cfg, model)
+
+def build(optimized: bool = False):
+    if optimized:
+        cfg = build_config(light=True)
+        return cfg, build_quantized(cfg)
+    from detectron2.engine import DefaultPredictor
+    cfg = build_config()
+    return cfg, DefaultPredictor(cfg)
+
+def load(optimized: bool = None):
+    global cfg, predictor
+    with lock:
+        if predictor is not None:
+            return predictor
+        cfg, predictor = build(config.VISION_OPTIMIZED if optimized is None else optimized)
+        return predictor
+
+# The first forward pass allocates buffers and picks kernels; do it before real frames arrive
+def warmup(width: int = 640, height: int = 480):
+    predict(np.zeros((height, width, 3), dtype=np.uint8))
 
 def predict(frame: cv2.typing.MatLike):
-    return predictor(frame)
+    return load()(frame)
+
+# Same preprocessing as DefaultPredictor.__call__, but one forward pass for all frames
+def run(model, frames: list):
+    import torch
+    inputs = []
+    for frame in frames:
+        if model.input_format == "RGB":
+            frame = frame[:, :, ::-1]
+        height, width = frame.shape[:2]
+        resized = model.aug.get_transform(frame).apply_image(frame)
+        tensor = torch.as_tensor(resized.astype("float32").transpose(2, 0, 1))
+        inputs.append({"image": tensor, "height": height, "width": width})
+    with torch.no_grad():
+        return model.model(inputs)
+
+def predict_batch(frames: list):
+    return run(load(), frames)
+
+def class_names():
+    from detectron2.data import MetadataCatalog
+    return MetadataCatalog.get(cfg.DATASETS.TRAIN[0]).thing_classes
+
+# What clients need from a prediction: class, score and box per detected instance
+def summarise(predictions):
+    return detections.summarise(detections.from_instances(predictions["instances"], masks=False), class_names())
 
 def visualise(frame: cv2.typing.MatLike, predictions):
+    from detectron2.utils.visualizer import Visualizer
+    from detectron2.data import MetadataCatalog
     v = Visualizer(frame[:, :, ::-1], MetadataCatalog.get(cfg.DATASETS.TRAIN[0]), scale=1.2)
     out = v.draw_instance_predictions(predictions["instances"].to("cpu"))
+    return out.get_image()[:, :, ::-1]
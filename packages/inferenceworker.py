@@ -0,0 +1,171 @@
+import concurrent.futures
+import math
+import multiprocessing
+import queue
+import threading
+
+import numpy as np
+from multiprocessing import shared_memory
+
+import packages.detections as detections
+
+# Runs the detector in a separate process on the same machine. Frames are written into a
+# ring of fixed-size slots in shared memory; only (request id, slot, shape) goes through
+# the request queue and packed detections come back through the result queue, so a frame
+# is copied once into its slot and never pickled. A slot is reused once its result is in.
+
+class FrameRing:
+    def __init__(self, slots: int, slot_bytes: int, name: str = None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots*slot_bytes)
+        else:
+            # Only the creating process unlinks the block
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+    def view(self, slot: int, shape: tuple):
+        start = slot*self.slot_bytes
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf[start:start+math.prod(shape)])
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def load_model():
+    import packages.image as image
+    image.load()
+    image.warmup()
+    return image.class_names()
+
+def infer_frame(frame: np.ndarray, masks: bool):
+    import packages.image as image
+    return detections.pack(detections.from_instances(image.predict(frame)["instances"], masks))
+
+def worker_main(ring_name: str, slots: int, slot_bytes: int, requests, results, load, infer, masks: bool):
+    ring = FrameRing(slots, slot_bytes, ring_name)
+    try:
+        try:
+            classes = load()
+        except Exception as e:
+            # E.g. detectron2 missing: the parent fails everything waiting on the worker
+            results.put(("failed", e))
+            return
+        results.put(("ready", classes))
+        while True:
+            item = requests.get()
+            if item is None:
+                break
+            request_id, slot, shape = item
+            try:
+                results.put((request_id, infer(ring.view(slot, shape), masks)))
+            except Exception as e:
+                results.put((request_id, e))
+    finally:
+        ring.close()
+
+class InferenceWorker:
+    def __init__(self, slots: int = 4, max_shape: tuple = (720, 1280, 3), masks: bool = False,
+                 load=load_model, infer=infer_frame):
+        context = multiprocessing.get_context("spawn")
+        self.ring = FrameRing(slots, math.prod(max_shape))
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(
+            target = worker_main,
+            args = (self.ring.name, slots, self.ring.slot_bytes, self.requests, self.results, load, infer, masks),
+            daemon = True
+        )
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.pending: dict[int, tuple[int, concurrent.futures.Future]] = {}
+        self.lock = threading.Lock()
+        self.nextid = 0
+        self.classes = []
+        # Set once the model is loaded, or once loading failed with error
+        self.ready = threading.Event()
+        self.error = None
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.collect, daemon=True)
+
+        self.onResult = lambda request_id, result:None
+
+    def start(self):
+        self.process.start()
+        self.thread.start()
+
+    def collect(self):
+        while True:
+            item = self.results.get()
+            if item is None:
+                return
+            if item[0] == "ready":
+                self.classes = item[1]
+                self.ready.set()
+                continue
+            if item[0] == "failed":
+                self.fail(item[1])
+                continue
+            request_id, packed = item
+            with self.lock:
+                slot, future = self.pending.pop(request_id)
+            self.free.put(slot)
+            if isinstance(packed, Exception):
+                future.set_exception(packed)
+                continue
+            result = detections.unpack(packed)
+            result["names"] = [self.classes[c] if c < len(self.classes) else str(c) for c in result["classes"].tolist()]
+            future.set_result(result)
+            self.onResult(request_id, result)
+
+    def fail(self, error: Exception):
+        with self.lock:
+            self.error = error
+            pending = list(self.pending.values())
+            self.pending.clear()
+        self.ready.set()
+        for slot, future in pending:
+            self.free.put(slot)
+            future.set_exception(error)
+
+    # By default never blocks the caller: when every slot is still being worked on the frame
+    # is dropped and None is returned, which is what a camera feed wants
+    def submit(self, frame: np.ndarray, block: bool = False, timeout: float = None):
+        if frame.dtype != np.uint8 or frame.nbytes > self.ring.slot_bytes:
+            raise ValueError(f"Frames must be uint8 and at most {self.ring.slot_bytes} bytes")
+        if self.error:
+            raise self.error
+        try:
+            slot = self.free.get(block, timeout)
+        except queue.Empty:
+            self.dropped += 1
+            return None
+        self.ring.view(slot, frame.shape)[...] = frame
+        future = concurrent.futures.Future()
+        with self.lock:
+            if self.error:
+                self.free.put(slot)
+                raise self.error
+            self.nextid += 1
+            request_id = self.nextid
+            self.pending[request_id] = (slot, future)
+        self.requests.put((request_id, slot, frame.shape))
+        return future
+
+    # Blocking form, e.g. as the predict function of a framesampler.FrameSampler
+    def predict(self, frame: np.ndarray, timeout: float = 30):
+        future = self.submit(frame, block=True, timeout=timeout)
+        if future is None:
+            raise TimeoutError("No free frame slot")
+        return future.result(timeout)
+
+    def close(self):
+        self.requests.put(None)
+        self.process.join()
+        self.results.put(None)
+        self.thread.join()
+        self.ring.close()
@@ -6,10 +6,13 @@ def getPrivateIp():
     ip = socket.gethostbyname(hostname)
     return ip
 
-def createListener(port: int = 8801):
-    return sc.socketServer("0.0.0.0", port)
+def createListener(port: int = 8801, name: str = None, framed: bool = False, max_frame: int = sc.MAX_FRAME):
+    socketserver = sc.socketServer("0.0.0.0", port, framed, max_frame)
+    if name:
+        socketserver.name = name
+    return socketserver
 
-def connectToListener(host: str, port: int):
-    socketclient = sc.socketClient(host, port)
+def connectToListener(host: str, port: int, framed: bool = False):
+    socketclient = sc.socketClient(host, port, framed)
     socketclient.connect()
     return socketclient
@@ -0,0 +1,101 @@
+import concurrent.futures
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+
+import packages.config as config
+import packages.metrics as metrics
+
+HASH_SECONDS = metrics.histogram("hush_password_hash_seconds", "Time from submitting a KDF job to getting its result", ("op",))
+HASH_REJECTED = metrics.counter("hush_password_hash_rejected_total", "KDF jobs refused by the concurrency limits", ("reason",))
+
+# Stored hashes look like "scrypt$<n>$<r>$<p>$<salt hex>$<key hex>". Profiles created
+# before the KDF was introduced hold a bare sha256 hex digest and are upgraded on login.
+
+def is_legacy(stored: str):
+    return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+def derive(password: str, salt: bytes, n: int, r: int, p: int):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256*n*r*p+(1 << 20), dklen=32)
+
+def hash_password(password: str, n: int, r: int, p: int):
+    salt = os.urandom(16)
+    return f"scrypt${n}${r}${p}${salt.hex()}${derive(password, salt, n, r, p).hex()}"
+
+def needs_rehash(stored: str, n: int, r: int, p: int):
+    return is_legacy(stored) or not stored.startswith(f"scrypt${n}${r}${p}$")
+
+def verify_password(password: str, stored: str):
+    if is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        scheme, n, r, p, salt, key = stored.split("$")
+    except ValueError:
+        return False
+    if scheme != "scrypt":
+        return False
+    return hmac.compare_digest(derive(password, bytes.fromhex(salt), int(n), int(r), int(p)).hex(), key)
+
+# Runs in the worker: verify and, when the record is outdated, produce its replacement
+# in the same round trip.
+def verify_and_rehash(password: str, stored: str, n: int, r: int, p: int):
+    if not verify_password(password, stored):
+        return False, None
+    if needs_rehash(stored, n, r, p):
+        return True, hash_password(password, n, r, p)
+    return True, None
+
+class HasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    def __init__(self, workers: int = None, max_pending: int = None, per_client: int = None,
+                 n: int = None, r: int = None, p: int = None, wait: float = 5.0):
+        self.n = n or config.SCRYPT_N
+        self.r = r or config.SCRYPT_R
+        self.p = p or config.SCRYPT_P
+        self.wait = wait
+        self.per_client = per_client or config.HASH_PER_CLIENT
+        # "spawn" keeps the workers independent of the listener threads of the parent
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers = workers or config.HASH_WORKERS,
+            mp_context = multiprocessing.get_context("spawn")
+        )
+        self.pending = threading.BoundedSemaphore(max_pending or config.HASH_MAX_PENDING)
+        self.clients: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def run(self, op: str, client: str, fn, *args):
+        with self.lock:
+            if self.clients.get(client, 0) >= self.per_client:
+                HASH_REJECTED.labels("client").inc()
+                raise HasherBusy("Too many attempts at once, please try again")
+            self.clients[client] = self.clients.get(client, 0)+1
+        try:
+            if not self.pending.acquire(timeout=self.wait):
+                HASH_REJECTED.labels("queue").inc()
+                raise HasherBusy("Server is busy, please try again")
+            try:
+                start = time.perf_counter()
+                result = self.executor.submit(fn, *args).result()
+                HASH_SECONDS.labels(op).observe(time.perf_counter()-start)
+                return result
+            finally:
+                self.pending.release()
+        finally:
+            with self.lock:
+                self.clients[client] -= 1
+                if not self.clients[client]:
+                    del self.clients[client]
+
+    def hash(self, password: str, client: str = ""):
+        return self.run("hash", client, hash_password, password, self.n, self.r, self.p)
+
+    def verify(self, password: str, stored: str, client: str = ""):
+        return self.run("verify", client, verify_and_rehash, password, stored, self.n, self.r, self.p)
+
+    def shutdown(self):
+        self.executor.shutdown()
@@ -0,0 +1,80 @@
+import collections
+import threading
+import time
+
+import packages.metrics as metrics
+import packages.profilestore as profilestore
+
+CACHE_LOOKUPS = metrics.counter("hush_profile_cache_lookups_total", "Profile cache lookups", ("result",))
+
+class CacheEntry:
+    def __init__(self, profile: dict, version, checked: float):
+        self.profile = profile
+        self.version = version
+        self.checked = checked
+
+class ProfileCache:
+    # Profiles handed out are shared between connections and must be treated as read-only.
+    def __init__(self, store: profilestore.ProfileStore = None, maxsize: int = 4096, check_interval: float = 1.0):
+        self.store = store or profilestore.open_store()
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.entries: collections.OrderedDict[str, CacheEntry] = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def remember(self, username: str, entry: CacheEntry):
+        with self.lock:
+            self.entries[username] = entry
+            self.entries.move_to_end(username)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self.lock:
+            self.entries.pop(username, None)
+
+    def lookup(self, username: str):
+        if not profilestore.valid_username(username):
+            return None
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry:
+                self.entries.move_to_end(username)
+        # Within check_interval the cached copy is trusted without asking the store at all
+        if entry and now-entry.checked < self.check_interval:
+            CACHE_LOOKUPS.labels("hit").inc()
+            return entry.profile, entry.version
+        version = self.store.version(username)
+        if version is None:
+            self.invalidate(username)
+            CACHE_LOOKUPS.labels("absent").inc()
+            return None
+        if entry and entry.version == version:
+            entry.checked = now
+            CACHE_LOOKUPS.labels("hit").inc()
+            return entry.profile, entry.version
+        CACHE_LOOKUPS.labels("miss").inc()
+        found = self.store.get(username)
+        if found is None:
+            return None
+        self.remember(username, CacheEntry(found[0], found[1], now))
+        return found
+
+    def get(self, username: str):
+        found = self.lookup(username)
+        return found[0] if found else None
+
+    def create(self, username: str, profile: dict):
+        if not self.store.create(username, profile):
+            return False
+        self.remember(username, CacheEntry(profile, self.store.version(username), time.monotonic()))
+        return True
+
+    def put(self, username: str, profile: dict, expected_version=None):
+        version = self.store.update(username, profile, expected_version)
+        if version is None:
+            self.invalidate(username)
+        else:
+            self.remember(username, CacheEntry(profile, version, time.monotonic()))
+        return version
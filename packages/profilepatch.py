@@ -0,0 +1,86 @@
+import copy
+
+# A small subset of RFC 6902 JSON Patch: "add", "remove", "replace" and "test" with
+# JSON pointer paths such as "/calming/techniques" or "/triggers/anxieties/-".
+
+class PatchError(ValueError):
+    pass
+
+def parse_pointer(path: str):
+    if not isinstance(path, str) or not path.startswith("/"):
+        raise PatchError(f"Invalid path: {path!r}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+def resolve(doc, parts: list, path: str):
+    for part in parts:
+        if isinstance(doc, dict) and part in doc:
+            doc = doc[part]
+        elif isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        else:
+            raise PatchError(f"Path does not exist: {path}")
+    return doc
+
+def list_index(container: list, part: str, path: str, adding: bool):
+    if adding and part == "-":
+        return len(container)
+    if not part.isdigit() or int(part) > len(container) or (not adding and int(part) == len(container)):
+        raise PatchError(f"Invalid list index in {path}")
+    return int(part)
+
+def apply_operation(doc, operation: dict):
+    op = operation.get("op")
+    path = operation.get("path")
+    parts = parse_pointer(path)
+    parent = resolve(doc, parts[:-1], path)
+    last = parts[-1]
+    if op == "test":
+        if resolve(parent, [last], path) != operation.get("value"):
+            raise PatchError(f"Test failed at {path}")
+    elif op in ("add", "replace"):
+        if "value" not in operation:
+            raise PatchError(f"Missing value for {path}")
+        value = copy.deepcopy(operation["value"])
+        if isinstance(parent, dict):
+            if op == "replace" and last not in parent:
+                raise PatchError(f"Path does not exist: {path}")
+            parent[last] = value
+        elif isinstance(parent, list):
+            index = list_index(parent, last, path, op == "add")
+            if op == "add":
+                parent.insert(index, value)
+            else:
+                parent[index] = value
+        else:
+            raise PatchError(f"Cannot modify {path}")
+    elif op == "remove":
+        if isinstance(parent, dict):
+            if last not in parent:
+                raise PatchError(f"Path does not exist: {path}")
+            del parent[last]
+        elif isinstance(parent, list):
+            del parent[list_index(parent, last, path, False)]
+        else:
+            raise PatchError(f"Cannot modify {path}")
+    else:
+        raise PatchError(f"Unsupported operation: {op!r}")
+
+# Patches come straight from clients, so their shape is checked before anything reads them
+def check_patch(patch):
+    if not isinstance(patch, list):
+        raise PatchError("Patch must be a list of operations")
+    for operation in patch:
+        if not isinstance(operation, dict):
+            raise PatchError("Patch operations must be objects")
+
+# The document is never modified in place; either every operation applies or none do.
+def apply_patch(doc: dict, patch: list):
+    check_patch(patch)
+    doc = copy.deepcopy(doc)
+    for operation in patch:
+        apply_operation(doc, operation)
+    return doc
+
+def touched_sections(patch: list):
+    check_patch(patch)
+    return {parse_pointer(operation.get("path"))[0] for operation in patch}
@@ -0,0 +1,83 @@
+import re
+
+# Declarative description of a profile. Dicts are objects with required keys, a
+# one-element list is a list of that item, and String adds limits to a plain str.
+# compile_schema() turns a description into a single validator function once, at import.
+
+class String:
+    def __init__(self, required: bool = False, max_length: int = 2000, pattern: str = None):
+        self.required = required
+        self.max_length = max_length
+        self.pattern = re.compile(pattern) if pattern else None
+
+USERNAME = String(required=True, max_length=32, pattern=r"[A-Za-z0-9_-][A-Za-z0-9_.-]*")
+PASSWORD = String(required=True, max_length=256)
+
+SCHEMA = {
+    "credentials": {"username": USERNAME, "password": PASSWORD},
+    "general": {"first_name": String(), "last_name": String(), "gender": String(), "dob": String()},
+    "diagnosis": {"autism_type": String(), "communication_styles": [String()]},
+    "calming": {"image_themes": [String()], "sound_themes": [String()], "techniques": String()},
+    "triggers": {"anxieties": [String()], "sensitivities": String()},
+    "emergency": {"primary_contact_name": String(), "relationship": String(), "phone": String(), "gps": String()},
+}
+
+# Login only needs a non-empty name: accounts created before USERNAME had a pattern
+# must still be able to sign in, and the stores check names before touching disk.
+LOGIN_SCHEMA = {"username": String(required=True, max_length=256), "password": PASSWORD}
+
+# Validators return None when the value is valid, otherwise (path, message) for the
+# first problem found. Paths are tuples of keys and list indexes.
+
+def compile_string(spec: String):
+    required, max_length, pattern = spec.required, spec.max_length, spec.pattern
+    def check(value):
+        if not isinstance(value, str):
+            return (), "must be a string"
+        if required and not value:
+            return (), "is required"
+        if len(value) > max_length:
+            return (), f"must be at most {max_length} characters"
+        if pattern and not pattern.fullmatch(value):
+            return (), "contains characters that are not allowed"
+    return check
+
+def compile_list(item):
+    def check(value):
+        if not isinstance(value, list):
+            return (), "must be a list"
+        for i, entry in enumerate(value):
+            error = item(entry)
+            if error:
+                return (i,)+error[0], error[1]
+    return check
+
+def compile_object(fields: list):
+    def check(value):
+        if not isinstance(value, dict):
+            return (), "must be an object"
+        for key, field in fields:
+            if key not in value:
+                return (key,), "is missing"
+            error = field(value[key])
+            if error:
+                return (key,)+error[0], error[1]
+    return check
+
+def compile_schema(schema):
+    if isinstance(schema, dict):
+        return compile_object([(key, compile_schema(field)) for key, field in schema.items()])
+    if isinstance(schema, list):
+        return compile_list(compile_schema(schema[0]))
+    if schema is str:
+        return compile_string(String())
+    if isinstance(schema, String):
+        return compile_string(schema)
+    raise TypeError(f"Unsupported schema entry: {schema!r}")
+
+def format_error(error):
+    path, message = error
+    return ".".join(str(part) for part in path)+" "+message if path else message
+
+validate = compile_schema(SCHEMA)
+validate_login = compile_schema(LOGIN_SCHEMA)
@@ -0,0 +1,242 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import packages.config as config
+
+# Stores map a username to (profile, version). The version changes on every write, so
+# it doubles as a change marker for caches.
+
+def valid_username(username: str):
+    return bool(username) and os.path.basename(username) == username and not username.startswith(".")
+
+class ProfileStore:
+    def get(self, username: str):
+        raise NotImplementedError
+
+    def version(self, username: str):
+        raise NotImplementedError
+
+    def create(self, username: str, profile: dict) -> bool:
+        raise NotImplementedError
+
+    def create_many(self, profiles: list):
+        return [self.create(username, profile) for username, profile in profiles]
+
+    def update(self, username: str, profile: dict, expected_version=None):
+        raise NotImplementedError
+
+    def iter_profiles(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class FileProfileStore(ProfileStore):
+    # One JSON file per user. Kept for development; versions are file mtimes.
+    def __init__(self, directory: str = "user_profiles"):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, username: str):
+        if not valid_username(username):
+            return None
+        return os.path.join(self.directory, f"{username}.json")
+
+    def version(self, username: str):
+        path = self.path(username)
+        if path is None:
+            return None
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self, username: str):
+        path = self.path(username)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                version = os.fstat(f.fileno()).st_mtime_ns
+                return json.loads(f.read()), version
+        except FileNotFoundError:
+            return None
+
+    def create(self, username: str, profile: dict):
+        # "x" mode makes the existence check and the create a single atomic step
+        path = self.path(username)
+        if path is None:
+            return False
+        try:
+            with open(path, "x") as f:
+                f.write(json.dumps(profile))
+        except FileExistsError:
+            return False
+        return True
+
+    def update(self, username: str, profile: dict, expected_version=None):
+        path = self.path(username)
+        if path is None:
+            return None
+        with self.lock:
+            if expected_version is not None and self.version(username) != expected_version:
+                return None
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(json.dumps(profile))
+            os.replace(tmp, path)
+            return self.version(username)
+
+    def iter_profiles(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                found = self.get(entry.name[:-len(".json")])
+                if found:
+                    yield found[0]
+
+class SQLiteProfileStore(ProfileStore):
+    def __init__(self, path: str = "user_profiles.db"):
+        self.path = path
+        self.local = threading.local()
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                username TEXT PRIMARY KEY,
+                profile TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    # sqlite3 connections are not shared between threads, every connection thread gets its own
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def version(self, username: str):
+        row = self.connection().execute("SELECT version FROM profiles WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, username: str):
+        row = self.connection().execute("SELECT profile, version FROM profiles WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def create(self, username: str, profile: dict):
+        if not valid_username(username):
+            return False
+        cursor = self.connection().execute(
+            "INSERT OR IGNORE INTO profiles (username, profile, version, updated) VALUES (?, ?, 1, ?)",
+            (username, json.dumps(profile), time.time())
+        )
+        return cursor.rowcount == 1
+
+    # One transaction for the whole batch instead of one commit per profile
+    def create_many(self, profiles: list):
+        conn = self.connection()
+        now = time.time()
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for username, profile in profiles:
+                if not valid_username(username):
+                    results.append(False)
+                    continue
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO profiles (username, profile, version, updated) VALUES (?, ?, 1, ?)",
+                    (username, json.dumps(profile), now)
+                )
+                results.append(cursor.rowcount == 1)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+    def update(self, username: str, profile: dict, expected_version=None):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version FROM profiles WHERE username = ?", (username,)).fetchone()
+            if row is None or (expected_version is not None and row[0] != expected_version):
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "UPDATE profiles SET profile = ?, version = ?, updated = ? WHERE username = ?",
+                (json.dumps(profile), row[0]+1, time.time(), username)
+            )
+            conn.execute("COMMIT")
+            return row[0]+1
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def empty(self):
+        return self.connection().execute("SELECT 1 FROM profiles LIMIT 1").fetchone() is None
+
+    def iter_profiles(self):
+        # A dedicated connection keeps the cursor independent of this thread's other queries
+        conn = sqlite3.connect(self.path)
+        try:
+            for (profile,) in conn.execute("SELECT profile FROM profiles ORDER BY username"):
+                yield json.loads(profile)
+        finally:
+            conn.close()
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn:
+            conn.close()
+            self.local.conn = None
+
+def open_store(backend: str = None, location: str = None) -> ProfileStore:
+    backend = backend or config.PROFILE_STORE
+    if backend == "sqlite":
+        store = SQLiteProfileStore(location or config.PROFILE_DB)
+        # Accounts made with the file store carry over the first time the database is used
+        if store.empty() and os.path.isdir(config.PROFILE_DIR):
+            imported, skipped = migrate(config.PROFILE_DIR, store)
+            print(f"Imported {imported} profiles from {config.PROFILE_DIR} into {store.path}, skipped {skipped}")
+        return store
+    if backend == "file":
+        return FileProfileStore(location or config.PROFILE_DIR)
+    raise ValueError(f"Unknown profile store: {backend}")
+
+def migrate(source: str, store: ProfileStore):
+    imported = skipped = 0
+    for entry in sorted(os.scandir(source), key=lambda e: e.name):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as f:
+                profile = json.loads(f.read())
+            username = profile["credentials"]["username"]
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Skipping {entry.name}: {e}")
+            skipped += 1
+            continue
+        if store.create(username, profile):
+            imported += 1
+        else:
+            print(f"Skipping {entry.name}: {username} already exists")
+            skipped += 1
+    return imported, skipped
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Import user_profiles/*.json into the SQLite profile store")
+    parser.add_argument("source", nargs="?", default=config.PROFILE_DIR)
+    parser.add_argument("database", nargs="?", default=config.PROFILE_DB)
+    args = parser.parse_args()
+    imported, skipped = migrate(args.source, SQLiteProfileStore(args.database))
+    print(f"Imported {imported} profiles into {args.database}, skipped {skipped}")
@@ -0,0 +1,189 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import packages.metrics as metrics
+
+QUEUE_WAIT = metrics.histogram("hush_querylog_queue_wait_seconds", "Time records spend queued before being written")
+QUEUE_DEPTH = metrics.gauge("hush_querylog_queue_depth", "Records waiting to be written")
+DROPPED = metrics.counter("hush_querylog_dropped_total", "Records dropped because the queue was full")
+BATCH_SIZE = metrics.histogram("hush_querylog_batch_records", "Records written per batch", buckets=(1, 4, 16, 64, 256, 1024))
+
+# Records are appended to "<prefix>-<start ms>.jsonl" segments. Every segment has a
+# "<prefix>-<start ms>.idx" sidecar with one [user, ts, offset, length] line per
+# record, so lookups only read the (small) index and seek straight to matches.
+
+def segment_name(prefix: str, start: float):
+    return f"{prefix}-{int(start*1000):013d}"
+
+def list_segments(directory: str, prefix: str):
+    segments = []
+    if not os.path.isdir(directory):
+        return segments
+    for name in os.listdir(directory):
+        if not (name.startswith(prefix+"-") and name.endswith(".jsonl")):
+            continue
+        stamp = name[len(prefix)+1:-len(".jsonl")]
+        if stamp.isdigit():
+            segments.append((int(stamp)/1000, os.path.join(directory, name[:-len(".jsonl")])))
+    segments.sort()
+    return segments
+
+class QueryLog:
+    def __init__(self, directory: str, prefix: str = "llm", max_bytes: int = 16*1024*1024,
+                 max_age: float = 24*60*60, keep: int = 30, queue_size: int = 10000,
+                 batch_size: int = 256, flush_interval: float = 1.0):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+
+        self.datafile = None
+        self.indexfile = None
+        self.segment_start = 0
+        self.segment_size = 0
+
+        self.thread = None
+        self.stopping = object()
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def log(self, **record):
+        # Never block the request thread: when the writer falls behind, drop and count.
+        record.setdefault("ts", time.time())
+        try:
+            self.queue.put_nowait((time.perf_counter(), record))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            DROPPED.inc()
+            return False
+
+    def close(self):
+        if self.thread:
+            self.queue.put((0, self.stopping))
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        running = True
+        while running:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch and batch[-1][1] is self.stopping:
+                batch.pop()
+                running = False
+            QUEUE_DEPTH.set(self.queue.qsize())
+            if batch:
+                now = time.perf_counter()
+                for queued, _ in batch:
+                    QUEUE_WAIT.observe(now-queued)
+                BATCH_SIZE.observe(len(batch))
+                self.write_batch([record for _, record in batch])
+            elif self.datafile and self.segment_expired():
+                self.rotate()
+        if self.datafile:
+            self.datafile.close()
+            self.indexfile.close()
+            self.datafile = None
+
+    def segment_expired(self):
+        return self.segment_size >= self.max_bytes or time.time()-self.segment_start >= self.max_age
+
+    def rotate(self, start: float = None):
+        if self.datafile:
+            self.datafile.close()
+            self.indexfile.close()
+        # Segments are named after their earliest record so time-range lookups can skip them.
+        self.segment_start = min(start or time.time(), time.time())
+        base = os.path.join(self.directory, segment_name(self.prefix, self.segment_start))
+        self.datafile = open(base+".jsonl", "ab")
+        self.indexfile = open(base+".idx", "ab")
+        self.segment_size = self.datafile.tell()
+        self.prune()
+
+    def prune(self):
+        segments = list_segments(self.directory, self.prefix)
+        for _, base in segments[:max(0, len(segments)-self.keep)]:
+            for ext in (".jsonl", ".idx"):
+                try:
+                    os.remove(base+ext)
+                except OSError:
+                    pass
+
+    def write_batch(self, records: list):
+        if self.datafile is None or self.segment_expired():
+            self.rotate(min(record["ts"] for record in records))
+        data = bytearray()
+        index = bytearray()
+        for record in records:
+            line = json.dumps(record, separators=(",", ":"), default=str).encode()+b"\n"
+            index += json.dumps([record.get("user"), record["ts"], self.segment_size+len(data), len(line)]).encode()+b"\n"
+            data += line
+        self.datafile.write(data)
+        self.datafile.flush()
+        self.indexfile.write(index)
+        self.indexfile.flush()
+        self.segment_size += len(data)
+
+class QueryLogReader:
+    def __init__(self, directory: str, prefix: str = "llm"):
+        self.directory = directory
+        self.prefix = prefix
+        # base path -> (bytes of .idx consumed, {user: [(ts, offset, length)]})
+        self.indexes: dict[str, tuple[int, dict]] = {}
+
+    def load_index(self, base: str):
+        consumed, users = self.indexes.get(base, (0, {}))
+        try:
+            with open(base+".idx", "rb") as f:
+                f.seek(consumed)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    consumed += len(line)
+                    user, ts, offset, length = json.loads(line)
+                    users.setdefault(user, []).append((ts, offset, length))
+        except FileNotFoundError:
+            pass
+        self.indexes[base] = (consumed, users)
+        return users
+
+    # "ts" is when a request started but records are written when it ends, so a segment can
+    # hold records older than its name or than the start of the segment before it. The
+    # data file's mtime is a safe upper bound (nothing is written before it happens); there
+    # is no safe lower bound, so "until" is only checked per record.
+    def query(self, user: str, since: float = None, until: float = None):
+        for start, base in list_segments(self.directory, self.prefix):
+            if since is not None:
+                try:
+                    if os.stat(base+".jsonl").st_mtime < since:
+                        continue
+                except FileNotFoundError:
+                    continue
+            matches = [
+                (offset, length) for ts, offset, length in self.load_index(base).get(user, [])
+                if (since is None or ts >= since) and (until is None or ts <= until)
+            ]
+            if not matches:
+                continue
+            with open(base+".jsonl", "rb") as f:
+                for offset, length in matches:
+                    f.seek(offset)
+                    yield json.loads(f.read(length))
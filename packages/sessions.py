@@ -0,0 +1,52 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+# Session tokens are "<base64 username|expiry>.<base64 hmac>". They are checked with the
+# server secret alone, so resuming a session needs no password hashing and no lookup
+# table, and any backend process sharing the secret can accept them.
+
+def b64encode(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def b64decode(text: str):
+    return base64.urlsafe_b64decode(text+"="*(-len(text) % 4))
+
+def load_secret(secret: str = None, path: str = "session.key"):
+    if secret:
+        return secret.encode()
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        key = os.urandom(32)
+        with open(path, "wb") as f:
+            f.write(key)
+        return key
+
+class SessionSigner:
+    def __init__(self, secret: bytes, lifetime: float = 30*24*60*60):
+        self.secret = secret
+        self.lifetime = lifetime
+
+    def sign(self, payload: bytes):
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()
+
+    def issue(self, username: str):
+        payload = f"{username}|{int(time.time()+self.lifetime)}".encode()
+        return b64encode(payload)+"."+b64encode(self.sign(payload))
+
+    def verify(self, token: str):
+        try:
+            payload, signature = token.split(".")
+            payload = b64decode(payload)
+            if not hmac.compare_digest(b64decode(signature), self.sign(payload)):
+                return None
+            username, expires = payload.decode().rsplit("|", 1)
+            if int(expires) < time.time():
+                return None
+            return username
+        except (ValueError, AttributeError):
+            return None
@@ -1,13 +1,58 @@
 import socket
 import threading
+import time
+
+import packages.metrics as metrics
+
+CONNECTIONS = metrics.counter("hush_connections_total", "Connections accepted", ("service",))
+ACTIVE_CONNECTIONS = metrics.gauge("hush_connections_active", "Connections currently open", ("service",))
+MESSAGE_BYTES = metrics.histogram("hush_message_bytes", "Size of received reads", ("service",), metrics.SIZE_BUCKETS)
+HANDLER_SECONDS = metrics.histogram("hush_handler_seconds", "Time spent in onmessage per read", ("service",))
+ERRORS = metrics.counter("hush_connection_errors_total", "Exceptions raised while serving a connection", ("service",))
 
 def getaddr(conn):
     return conn.getpeername()
 
+# Framed connections prefix every message with its length (4 bytes, big endian), so a
+# message arrives in one onmessage call however TCP splits or merges the reads. A length
+# over the reader's limit raises, which closes the connection instead of buffering it.
+MAX_FRAME = 16*1024*1024
+
+def frame(data: bytes):
+    return len(data).to_bytes(4, "big")+data
+
+def send_frame(conn: socket.socket, data: bytes):
+    conn.sendall(frame(data))
+
+class FrameReader:
+    def __init__(self, max_size: int = MAX_FRAME):
+        self.buffer = bytearray()
+        self.max_size = max_size
+
+    def feed(self, data: bytes):
+        self.buffer += data
+        frames = []
+        start = 0
+        while len(self.buffer)-start >= 4:
+            length = int.from_bytes(self.buffer[start:start+4], "big")
+            if length > self.max_size:
+                raise ValueError(f"Frame of {length} bytes is over the {self.max_size} byte limit")
+            if len(self.buffer)-start-4 < length:
+                break
+            frames.append(bytes(self.buffer[start+4:start+4+length]))
+            start += 4+length
+        if start:
+            del self.buffer[:start]
+        return frames
+
 class socketServer():
-    def __init__(self, host:str="0.0.0.0", port:int=8001):
+    def __init__(self, host:str="0.0.0.0", port:int=8001, framed:bool=False, max_frame:int=MAX_FRAME):
         self.host = host
         self.port = port
+        self.name = str(port)
+        self.framed = framed
+        self.max_frame = max_frame
+        self.recvsize = 65536 if framed else 1024
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.s.bind((host, port))
 
@@ -31,29 +76,45 @@ class socketServer():
             threading.Thread(target=self.handle_client, args=(conn, addr)).start()
 
     def handle_client(self, conn: socket.socket, addr):
+        CONNECTIONS.labels(self.name).inc()
+        active = ACTIVE_CONNECTIONS.labels(self.name)
+        message_bytes = MESSAGE_BYTES.labels(self.name)
+        handler_seconds = HANDLER_SECONDS.labels(self.name)
+        active.inc()
+        reader = FrameReader(self.max_frame) if self.framed else None
         self.onopen(conn)
         try:
             with conn:
                 while True:
                     try:
-                        data = conn.recv(1024)
+                        data = conn.recv(self.recvsize)
                         if not data:
                             break
-                        self.onmessage(conn, data)
+                        message_bytes.observe(len(data))
+                        start = time.perf_counter()
+                        for message in (reader.feed(data) if reader else [data]):
+                            self.onmessage(conn, message)
+                        handler_seconds.observe(time.perf_counter()-start)
                     except Exception as e:
+                        ERRORS.labels(self.name).inc()
                         self.onerror(conn, e)
                         break
         except Exception as e:
+            ERRORS.labels(self.name).inc()
             self.onerror(conn, e)
         finally:
+            active.dec()
             self.onclose(conn)
 
 class socketClient():
-    def __init__(self, host: str = "127.0.0.1", port: int = 8801):
+    def __init__(self, host: str = "127.0.0.1", port: int = 8801, framed: bool = False):
         self.host = host
         self.port = port
+        self.framed = framed
+        self.recvsize = 65536 if framed else 1024
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.running = False
+        self.sendlock = threading.Lock()
 
     def connect(self):
         try:
@@ -67,7 +128,8 @@ class socketClient():
 
     def send(self, data: bytes):
         try:
-            self.s.sendall(data)
+            with self.sendlock:
+                self.s.sendall(frame(data) if self.framed else data)
         except Exception as e:
             self.onerror(self.s, e)
 
@@ -82,13 +144,15 @@ class socketClient():
             self.onclose(self.addr)
 
     def listen(self):
+        reader = FrameReader() if self.framed else None
         try:
             while self.running:
                 try:
-                    data = self.s.recv(1024)
+                    data = self.s.recv(self.recvsize)
                     if not data:
                         break
-                    self.onmessage(self.s, data)
+                    for message in (reader.feed(data) if reader else [data]):
+                        self.onmessage(self.s, message)
                     #print(f"[+] sockcomm.py: function call: self.onmessage({data})")
                 except Exception as e:
                     self.onerror(self.s, e)
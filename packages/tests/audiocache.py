@@ -0,0 +1,55 @@
+import packages.audiocache as audiocache
+import datetime
+import io
+import threading
+import time
+import types
+import wave
+
+def wav(frames: bytes, extra: bool = False):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(frames)
+    data = buffer.getvalue()
+    # Same samples, different header layout: an extra chunk before "data"
+    if extra:
+        data = data[:12]+b"LIST\x04\x00\x00\x00test"+data[12:]
+        data = data[:4]+(len(data)-8).to_bytes(4, "little")+data[8:]
+    return data
+
+pcm = bytes(range(256))*64
+assert audiocache.pcm_key(wav(pcm)) == audiocache.pcm_key(wav(pcm, extra=True))
+assert audiocache.pcm_key(wav(pcm)) != audiocache.pcm_key(wav(pcm[::-1]))
+
+cache = audiocache.TTLCache("test", maxsize=2, ttl=.2)
+cache.put("a", 1)
+cache.put("b", 2)
+cache.get("a")
+cache.put("c", 3)
+assert cache.get("b") is None and cache.get("a") == 1
+time.sleep(.25)
+assert cache.get("a") is None
+
+# A retry racing the original request waits for it instead of describing again
+calls = []
+def slow():
+    calls.append(1)
+    time.sleep(.2)
+    return "description"
+threads = [threading.Thread(target=cache.get_or_create, args=("clip", slow)) for _ in range(5)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert len(calls) == 1 and cache.get("clip") == "description" and not cache.keylocks
+
+uploads = audiocache.UploadRegistry(margin=60)
+soon = types.SimpleNamespace(expiration_time=datetime.datetime.now(datetime.timezone.utc)+datetime.timedelta(seconds=30))
+later = types.SimpleNamespace(expiration_time=datetime.datetime.now(datetime.timezone.utc)+datetime.timedelta(hours=1))
+uploads.put("soon", soon)
+uploads.put("later", later)
+assert uploads.get("soon") is None and uploads.get("later") is later
+print("ok")
@@ -0,0 +1,39 @@
+import packages.audiocodec as ac
+import numpy as np
+import time
+
+rate = 16000
+seconds = 30
+t = np.arange(rate*seconds)/rate
+# Speech-like test signal: a few harmonics of a gliding pitch with a syllable envelope
+pitch = 150+30*np.sin(2*np.pi*.5*t)
+phase = 2*np.pi*np.cumsum(pitch)/rate
+signal = sum(np.sin(k*phase)/k for k in range(1, 12))*(.5+.5*np.sin(2*np.pi*4*t))**2
+pcm = (6000*signal).astype("<i2").tobytes()
+
+def snr(reference: np.ndarray, decoded: np.ndarray):
+    noise = reference-decoded
+    return 10*np.log10(np.sum(reference**2)/max(np.sum(noise**2), 1e-9))
+
+for fmt, target in [("pcm16", 16000), ("mulaw", 16000), ("pcm16", 8000), ("mulaw", 8000)]:
+    encoder = ac.Encoder(fmt, rate, target)
+    start = time.perf_counter()
+    # Recorder-sized chunks, as the stream encodes them
+    encoded = b"".join(encoder.encode(pcm[i:i+2048]) for i in range(0, len(pcm), 2048))
+    encode_time = time.perf_counter()-start
+    start = time.perf_counter()
+    decoded = ac.decode(encoded, fmt)
+    decode_time = time.perf_counter()-start
+
+    reference = np.frombuffer(pcm, dtype="<i2").astype(np.float64)
+    decoded = np.frombuffer(decoded, dtype="<i2").astype(np.float64)
+    print(f"{fmt:>5} @ {target:>5} Hz: {len(encoded)/seconds/1024:6.1f} KiB/s ({len(pcm)/len(encoded):.1f}x), "
+          f"encode {encode_time/seconds*1000:.2f} ms/s, decode {decode_time/seconds*1000:.2f} ms/s")
+    if target == rate:
+        print(f"{'':>17}SNR {snr(reference, decoded):.1f} dB")
+        assert snr(reference, decoded) > 30
+    assert len(pcm)/len(encoded) >= (rate/target)*(2 if fmt == "mulaw" else 1)*.99
+
+# Chunked decimation must match encoding the whole recording at once
+chunked = ac.Encoder("pcm16", rate, 8000)
+assert b"".join(chunked.encode(pcm[i:i+2050]) for i in range(0, len(pcm), 2050)) == ac.Encoder("pcm16", rate, 8000).encode(pcm)
@@ -0,0 +1,57 @@
+import packages.batching as batching
+import sys
+import threading
+import time
+
+# Throughput vs p95 latency for several batching settings, with CLIENTS threads each
+# submitting frames back to back. By default the model is simulated by a batched call
+# costing FIXED + PER_ITEM*n seconds (the shape of a CPU forward pass: fixed overhead
+# plus a smaller per-frame cost). Pass "model" to run the real detector instead.
+CLIENTS = 8
+SECONDS = 3
+FIXED = .04
+PER_ITEM = .015
+
+def simulated(frames: list):
+    time.sleep(FIXED+PER_ITEM*len(frames))
+    return [len(frames)]*len(frames)
+
+def run(fn, frame, max_batch: int, max_wait_ms: float):
+    batcher = batching.MicroBatcher(fn, max_batch, max_wait_ms, "bench")
+    latencies = []
+    lock = threading.Lock()
+    end = time.perf_counter()+SECONDS
+    def client():
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            batcher(frame)
+            with lock:
+                latencies.append(time.perf_counter()-start)
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter()-start
+    batcher.close()
+    latencies.sort()
+    return len(latencies)/elapsed, latencies[int(len(latencies)*.95)-1]
+
+if __name__ == "__main__":
+    if "model" in sys.argv:
+        import numpy as np
+        import packages.image as image
+        image.load()
+        image.warmup()
+        fn, frame = image.predict_batch, np.random.randint(0, 255, (480, 640, 3), np.uint8)
+    else:
+        fn, frame = simulated, None
+
+    results = {}
+    for max_batch, max_wait_ms in [(1, 0), (2, 5), (4, 5), (4, 10), (8, 10), (8, 25)]:
+        fps, p95 = run(fn, frame, max_batch, max_wait_ms)
+        results[max_batch, max_wait_ms] = fps
+        print(f"max_batch {max_batch:>2}, max_wait {max_wait_ms:>2}ms: {fps:6.1f} frames/s, p95 {p95*1000:6.1f}ms")
+    if "model" not in sys.argv:
+        assert results[4, 10] > results[1, 0]*1.5
@@ -0,0 +1,56 @@
+import packages.bulkprofiles as bp
+import packages.passwords as passwords
+import contextlib
+import tempfile
+import copy
+import json
+import sys
+import io
+import os
+
+if __name__ == "__main__":
+    with open("user_profiles/philippo.json")as f:
+        profile = json.loads(f.read())
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "profiles.jsonl")
+    errors = os.path.join(directory, "errors.jsonl")
+    with open(source, "w") as f:
+        for name in ("amy", "bob", "carl"):
+            entry = copy.deepcopy(profile)
+            entry["credentials"] = {"username": name, "password": name+"-pw"}
+            f.write(json.dumps(entry)+"\n")
+
+    # Plain passwords are hashed on import
+    first = os.path.join(directory, "first")
+    assert bp.main(["import", source, "--store", "file", "--location", first, "--errors", errors, "--workers", "2"]) == 0
+    with open(os.path.join(first, "bob.json")) as f:
+        assert passwords.verify_password("bob-pw", json.load(f)["credentials"]["password"])
+
+    # Importing the same file again skips every record as a duplicate
+    assert bp.main(["import", source, "--store", "file", "--location", first, "--errors", errors, "--prehashed"]) == 1
+    with open(errors) as f:
+        skipped = [json.loads(line) for line in f]
+    print(skipped)
+    assert [(e["line"], e["username"], e["error"]) for e in skipped] == [
+        (1, "amy", "Username is taken"), (2, "bob", "Username is taken"), (3, "carl", "Username is taken")
+    ]
+
+    # Exporting to stdout leaves stdout open for the caller
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert bp.main(["export", "-", "--store", "file", "--location", first]) == 0
+    assert not out.closed
+    exported = sorted(out.getvalue().splitlines())
+    assert [json.loads(line)["credentials"]["username"] for line in exported] == ["amy", "bob", "carl"]
+
+    # The export imports as-is into a fresh store and exports back unchanged
+    copied = os.path.join(directory, "exported.jsonl")
+    with open(copied, "w") as f:
+        f.write("\n".join(exported)+"\n")
+    second = os.path.join(directory, "second")
+    assert bp.main(["import", copied, "--store", "file", "--location", second, "--prehashed"]) == 0
+    again = os.path.join(directory, "again.jsonl")
+    assert bp.main(["export", again, "--store", "file", "--location", second]) == 0
+    with open(again) as f:
+        assert sorted(f.read().splitlines()) == exported
+    assert not sys.stdout.closed
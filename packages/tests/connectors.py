@@ -0,0 +1,96 @@
+import packages.connectors as c
+import packages.sessions as sessions
+import hashlib
+import os
+import random
+import socket
+import threading
+import time
+
+# Upload protocol of the audio service over loopback. The description of a recording is
+# replaced by its digest, so no Gemini calls are made and each client can check it got
+# its own recording back.
+c.AUDESC_PORT = random.randint(20000, 30000)
+c.audioparser.describe = lambda studio, audio: hashlib.sha256(audio.read()).hexdigest()
+
+class LLM:
+    studio = None
+
+server = c.audioDescServerSide(LLM(), sessions.SessionSigner(os.urandom(32)))
+server.start()
+time.sleep(.2)
+
+def client():
+    cs = c.audioDescClientSide("127.0.0.1")
+    cs.described = []
+    cs.errors = []
+    cs.done = threading.Event()
+    cs.gotAudioDescription = lambda description: (cs.described.append(description), cs.done.set())
+    cs.onUploadError = lambda error: (cs.errors.append(error), cs.done.set())
+    return cs
+
+def digest(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+# Concurrent uploads on separate connections, each spanning several chunks
+clients = [client() for _ in range(4)]
+recordings = [os.urandom(3*c.AUDIO_CHUNK_SIZE+i*1000) for i in range(4)]
+threads = [threading.Thread(target=cs.upload, args=(data, {"format": "wav"})) for cs, data in zip(clients, recordings)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+for cs, data in zip(clients, recordings):
+    assert cs.done.wait(10)
+    assert cs.described == [digest(data)] and cs.errors == []
+print("concurrent uploads ok")
+
+# An upload larger than announced fails on its second chunk and the client stops sending.
+# Chunks that were already on the wire get errors for that upload, which must not fail
+# the next upload started right after.
+cs = clients[0]
+cs.done.clear()
+cs.described.clear()
+cs.startUpload(c.AUDIO_CHUNK_SIZE, {"format": "wav"})
+sent = 0
+for seq in range(8):
+    if not cs.sendChunk(seq, os.urandom(c.AUDIO_CHUNK_SIZE)):
+        break
+    sent += 1
+assert cs.done.wait(5)
+for seq in range(sent, sent+4):
+    cs.sclient.send(bytes([cs.uploadChunkPckt])+cs.uploadid.to_bytes(4, "big")+seq.to_bytes(4, "big")+os.urandom(1000))
+data = os.urandom(2*c.AUDIO_CHUNK_SIZE)
+cs.upload(data, {"format": "wav"})
+end = time.time()+10
+while not cs.described and time.time() < end:
+    time.sleep(.01)
+print(f"oversize upload: {sent} chunks sent, errors {cs.errors}")
+assert cs.errors == ["Upload is larger than announced"]
+assert cs.described == [digest(data)]
+
+# A START with broken metadata is answered with an error
+cs = client()
+cs.sclient.send(bytes([cs.uploadStartPckt])+(1).to_bytes(4, "big")+(0).to_bytes(8, "big")+b"{not json")
+cs.uploadid = 1
+assert cs.done.wait(5) and cs.errors == ["Invalid upload metadata"]
+
+# A client going away mid-upload leaves nothing behind on the server
+cs = client()
+cs.startUpload(0, {"format": "wav"})
+cs.sendChunk(0, os.urandom(1000))
+time.sleep(.2)
+assert len(server.uploads) == 1
+cs.sclient.close()
+time.sleep(.2)
+assert not server.uploads
+
+# A frame over AUDIO_MAX_FRAME closes the connection instead of being buffered
+raw = socket.create_connection(("127.0.0.1", c.AUDESC_PORT))
+raw.settimeout(5)
+raw.sendall((c.AUDIO_MAX_FRAME+1).to_bytes(4, "big"))
+assert raw.recv(1) == b""
+print("abort and oversize frame ok")
+
+# The listener thread never returns
+os._exit(0)
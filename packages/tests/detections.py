@@ -0,0 +1,44 @@
+import packages.detections as det
+import numpy as np
+import time
+
+rng = np.random.default_rng(0)
+height, width = 480, 640
+
+def blob(cx: int, cy: int, r: int):
+    y, x = np.ogrid[:height, :width]
+    return (x-cx)**2+(y-cy)**2 <= r*r
+
+masks = np.stack([blob(100, 100, 60), blob(320, 240, 150), blob(600, 450, 80), np.zeros((height, width), bool)])
+result = {
+    "size": (height, width),
+    "boxes": np.array([[40, 40, 160, 160], [170, 90, 470, 390], [520, 370, 640, 480], [0, 0, 1, 1]], dtype=np.int16),
+    "classes": np.array([0, 56, 62, 1], dtype=np.uint8),
+    "scores": np.array([.98, .75, .51, .5], dtype=np.float32),
+    "masks": [det.encode_mask(mask) for mask in masks],
+}
+
+# Known value: 2x2 mask with only the bottom-right pixel set -> runs [3, 1]
+assert det.rle_counts(np.array([[0, 0], [0, 1]], bool)).tolist() == [3, 1]
+assert det.rle_counts(np.array([[1, 0], [0, 0]], bool)).tolist() == [0, 1, 3]
+
+start = time.perf_counter()
+packed = det.pack(result)
+encoded = time.perf_counter()-start
+start = time.perf_counter()
+unpacked = det.unpack(packed)
+decoded_masks = det.masks(unpacked)
+decoded = time.perf_counter()-start
+
+raw = masks.nbytes+4*4*4+4*4+4*8
+print(f"{len(packed)} bytes packed vs {raw} bytes raw ({raw/len(packed):.0f}x), pack {encoded*1000:.2f}ms, unpack+decode {decoded*1000:.2f}ms")
+assert (decoded_masks == masks).all()
+assert (unpacked["boxes"] == result["boxes"]).all() and (unpacked["classes"] == result["classes"]).all()
+assert np.abs(unpacked["scores"]-result["scores"]).max() < 1e-4
+
+for mask in [rng.random((37, 53)) > .5, np.ones((10, 10), bool), np.zeros((0, 0), bool)]:
+    assert (det.decode_mask(det.encode_mask(mask), *mask.shape) == mask).all()
+
+no_masks = det.unpack(det.pack(dict(result, masks=None)))
+assert no_masks["masks"] is None and len(det.pack(dict(result, masks=None))) == det.HEADER.size+4*det.RECORD.itemsize
+assert det.summarise(no_masks, {0: "person", 1: "bicycle", 56: "chair", 62: "tv"})[0]["class"] == "person"
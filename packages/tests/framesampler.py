@@ -0,0 +1,36 @@
+import packages.framesampler as fs
+import numpy as np
+import time
+
+rng = np.random.default_rng(0)
+background = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+
+def scene(x: int):
+    frame = background.copy()
+    frame[200:300, x:x+120] = 255
+    # Sensor noise, which must not count as a change
+    return np.clip(frame.astype(np.int16)+rng.integers(-4, 5, frame.shape), 0, 255).astype(np.uint8)
+
+calls = []
+sampler = fs.FrameSampler(lambda frame: calls.append(1) or len(calls), fps=10)
+
+# 30 fps camera for 4 seconds: static, then the object moves, then static again
+now = 0.0
+elapsed = 0.0
+for i in range(120):
+    x = 50 if i < 40 else (50+(i-40)*10 if i < 80 else 450)
+    frame = scene(x)
+    start = time.perf_counter()
+    predictions, fresh = sampler.process(frame, now)
+    elapsed += time.perf_counter()-start
+    now += 1/30
+
+print(dict(sampler.stats), f"{elapsed/120*1000:.3f}ms per frame")
+assert sampler.stats["rate"] > 70
+assert 12 <= sampler.stats["inferred"] <= 16
+assert sampler.stats["unchanged"] >= 15
+
+# Reused predictions are refreshed after max_age even when nothing changes
+sampler = fs.FrameSampler(lambda frame: time.monotonic(), fps=0, max_age=1)
+frame = scene(50)
+assert sampler.process(frame, 0)[1] and not sampler.process(frame, .5)[1] and sampler.process(frame, 1.5)[1]
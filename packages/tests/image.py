@@ -0,0 +1,104 @@
+import packages.image as image
+import cv2
+import numpy as np
+import sys
+import time
+
+# Compares the optimized detector (light preset, int8 box head) with the full-precision
+# DefaultPredictor on sample images, one frame at a time and batched like the service:
+#
+#   python -m packages.tests.image photo1.jpg photo2.jpg ...
+#
+# There is no ground truth here, so "drift" is the AP50 of the optimized detections
+# scored against the full-precision ones.
+
+def boxes(predictions):
+    instances = predictions["instances"].to("cpu")
+    return instances.pred_boxes.tensor.numpy(), instances.scores.numpy(), instances.pred_classes.numpy()
+
+def iou(box: np.ndarray, others: np.ndarray):
+    x0 = np.maximum(box[0], others[:, 0])
+    y0 = np.maximum(box[1], others[:, 1])
+    x1 = np.minimum(box[2], others[:, 2])
+    y1 = np.minimum(box[3], others[:, 3])
+    inter = np.clip(x1-x0, 0, None)*np.clip(y1-y0, 0, None)
+    area = lambda b: (b[..., 2]-b[..., 0])*(b[..., 3]-b[..., 1])
+    return inter/(area(box)+area(others)-inter+1e-9)
+
+def average_precision(references: list, detections: list, cls: int, threshold: float = .5):
+    scored = []
+    total = 0
+    for (ref_boxes, _, ref_classes), (det_boxes, det_scores, det_classes) in zip(references, detections):
+        truth = ref_boxes[ref_classes == cls]
+        total += len(truth)
+        matched = np.zeros(len(truth), bool)
+        keep = det_classes == cls
+        for i in np.argsort(-det_scores[keep]):
+            box = det_boxes[keep][i]
+            hit = False
+            if len(truth):
+                overlaps = iou(box, truth)
+                best = int(np.argmax(overlaps))
+                if overlaps[best] >= threshold and not matched[best]:
+                    matched[best] = hit = True
+            scored.append((det_scores[keep][i], hit))
+    if not total:
+        return None
+    scored.sort(key=lambda entry: -entry[0])
+    hits = np.cumsum([hit for _, hit in scored])
+    precision = hits/np.arange(1, len(scored)+1)
+    recall = hits/total
+    # All-point interpolated AP
+    ap = 0.0
+    previous = 0.0
+    for r in np.unique(recall):
+        ap += (r-previous)*precision[recall >= r].max()
+        previous = r
+    return ap
+
+def timed(predictor, frames: list, repeat: int = 3):
+    predictor(frames[0])
+    latencies = []
+    outputs = []
+    for frame in frames:
+        for i in range(repeat):
+            start = time.perf_counter()
+            output = predictor(frame)
+            latencies.append(time.perf_counter()-start)
+        outputs.append(output)
+    latencies.sort()
+    return outputs, np.mean(latencies), latencies[int(len(latencies)*.95)-1] if len(latencies) > 1 else latencies[0]
+
+# Seconds per frame when frames go through predict_batch's path in batches of batch_size
+def batched(predictor, frames: list, batch_size: int = 4):
+    batches = [frames[i:i+batch_size] for i in range(0, len(frames), batch_size)]
+    image.run(predictor, batches[0])
+    start = time.perf_counter()
+    for batch in batches:
+        image.run(predictor, batch)
+    return (time.perf_counter()-start)/len(frames)
+
+if __name__ == "__main__":
+    paths = sys.argv[1:]
+    if not paths:
+        sys.exit("usage: python -m packages.tests.image IMAGE [IMAGE ...]")
+    frames = [cv2.imread(path) for path in paths]
+
+    _, baseline = image.build(optimized=False)
+    start = time.perf_counter()
+    _, optimized = image.build(optimized=True)
+    print(f"optimized model ready in {time.perf_counter()-start:.1f}s (run again to time loading the cached model)")
+
+    reference, base_mean, base_p95 = timed(baseline, frames)
+    candidate, opt_mean, opt_p95 = timed(optimized, frames)
+    print(f"full precision: mean {base_mean*1000:.0f}ms, p95 {base_p95*1000:.0f}ms")
+    print(f"optimized:      mean {opt_mean*1000:.0f}ms, p95 {opt_p95*1000:.0f}ms ({base_mean/opt_mean:.1f}x)")
+    base_batched = batched(baseline, frames)
+    opt_batched = batched(optimized, frames)
+    print(f"batched by 4:   full precision {base_batched*1000:.0f}ms/frame, optimized {opt_batched*1000:.0f}ms/frame")
+
+    reference = [boxes(output) for output in reference]
+    candidate = [boxes(output) for output in candidate]
+    classes = np.unique(np.concatenate([classes for _, _, classes in reference]))
+    aps = [ap for ap in (average_precision(reference, candidate, cls) for cls in classes) if ap is not None]
+    print(f"AP50 of optimized vs full precision over {len(classes)} classes: {np.mean(aps) if aps else float('nan'):.3f}")
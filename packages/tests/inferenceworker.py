@@ -0,0 +1,93 @@
+import packages.inferenceworker as iw
+import packages.detections as det
+import multiprocessing
+import numpy as np
+import time
+
+# Stand-in model so the shared-memory path can be checked without detectron2: reports the
+# frame's mean as a score and its size as a box
+def load():
+    return ["frame"]
+
+def infer(frame: np.ndarray, masks: bool):
+    height, width = frame.shape[:2]
+    return det.pack({
+        "size": (height, width),
+        "boxes": np.array([[0, 0, width, height]], dtype=np.int16),
+        "classes": np.array([0], dtype=np.uint8),
+        "scores": np.array([frame.mean()/255], dtype=np.float32),
+        "masks": None,
+    })
+
+def broken_load():
+    raise ImportError("No module named 'detectron2'")
+
+def slow_infer(frame: np.ndarray, masks: bool):
+    time.sleep(.05)
+    return infer(frame, masks)
+
+# The alternative: frames pickled through a queue to the worker
+def echo(requests, results):
+    while True:
+        frame = requests.get()
+        if frame is None:
+            return
+        results.put(infer(frame, False))
+
+if __name__ == "__main__":
+    frames = [np.full((720, 1280, 3), i*10, dtype=np.uint8) for i in range(20)]
+
+    worker = iw.InferenceWorker(slots=3, max_shape=(720, 1280, 3), load=load, infer=infer)
+    worker.start()
+    worker.ready.wait(30)
+    start = time.perf_counter()
+    results = [worker.predict(frame) for frame in frames]
+    shared = (time.perf_counter()-start)/len(frames)
+    worker.close()
+    for i, result in enumerate(results):
+        assert result["names"] == ["frame"] and result["boxes"].tolist() == [[0, 0, 1280, 720]]
+        assert abs(result["scores"][0]-i*10/255) < 1e-3
+
+    context = multiprocessing.get_context("spawn")
+    requests, replies = context.Queue(), context.Queue()
+    process = context.Process(target=echo, args=(requests, replies))
+    process.start()
+    requests.put(frames[0])
+    replies.get()
+    start = time.perf_counter()
+    for frame in frames:
+        requests.put(frame)
+        replies.get()
+    pickled = (time.perf_counter()-start)/len(frames)
+    requests.put(None)
+    process.join()
+    print(f"{frames[0].nbytes/1e6:.1f} MB frames, round trip incl. a mean over the frame: "
+          f"shared memory {shared*1000:.2f}ms, pickled queue {pickled*1000:.2f}ms")
+
+    # Submitting faster than the worker keeps up drops frames instead of blocking
+    worker = iw.InferenceWorker(slots=3, max_shape=(720, 1280, 3), load=load, infer=slow_infer)
+    worker.start()
+    worker.ready.wait(30)
+    futures = [worker.submit(frames[0]) for i in range(10)]
+    assert futures.count(None) == 7 and worker.dropped == 7
+    for future in futures:
+        if future:
+            future.result(5)
+    worker.close()
+
+    # A model that fails to load fails the waiting futures instead of leaving them hanging
+    worker = iw.InferenceWorker(slots=3, max_shape=(720, 1280, 3), load=broken_load, infer=slow_infer)
+    future = worker.submit(frames[0])
+    worker.start()
+    assert worker.ready.wait(30) and isinstance(worker.error, ImportError)
+    try:
+        future.result(5)
+        assert False
+    except ImportError as e:
+        print("load failure reported:", e)
+    try:
+        worker.predict(frames[0])
+        assert False
+    except ImportError:
+        pass
+    worker.close()
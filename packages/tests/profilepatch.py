@@ -0,0 +1,32 @@
+import packages.profilepatch as pp
+import json
+
+with open("user_profiles/philippo.json")as f:
+    profile = json.loads(f.read())
+
+patch = [
+    {"op": "add", "path": "/triggers/anxieties/-", "value": "thunder"},
+    {"op": "replace", "path": "/emergency/phone", "value": "0123"},
+]
+updated = pp.apply_patch(profile, patch)
+assert updated["triggers"]["anxieties"][-1] == "thunder"
+assert updated["emergency"]["phone"] == "0123"
+assert profile["emergency"]["phone"] != "0123" # original untouched
+assert pp.touched_sections(patch) == {"triggers", "emergency"}
+
+# Failed operations leave nothing applied
+try:
+    pp.apply_patch(profile, patch+[{"op": "remove", "path": "/nothing/here"}])
+    assert False
+except pp.PatchError as e:
+    print(e)
+
+# Malformed patches from clients are PatchErrors, never TypeError/AttributeError
+for bad in [None, {"op": "add"}, "patch", [1], [None], [{"op": "add", "path": 3}], [{"op": "add"}]]:
+    for fn in (pp.touched_sections, lambda p: pp.apply_patch(profile, p)):
+        try:
+            fn(bad)
+            assert False, bad
+        except pp.PatchError as e:
+            pass
+print("malformed patches rejected")
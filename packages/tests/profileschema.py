@@ -0,0 +1,30 @@
+import packages.profileschema as ps
+import json
+import copy
+
+with open("user_profiles/philippo.json")as f:
+    profile = json.loads(f.read())
+profile["credentials"]["password"] = "123"
+assert ps.validate(profile) is None
+
+broken = copy.deepcopy(profile)
+broken["calming"]["image_themes"] = "Nature"
+print(ps.format_error(ps.validate(broken)))
+assert ps.validate(broken) == (("calming", "image_themes"), "must be a list")
+
+broken = copy.deepcopy(profile)
+broken["triggers"]["anxieties"].append(3)
+assert ps.validate(broken) == (("triggers", "anxieties", 3), "must be a string")
+
+broken = copy.deepcopy(profile)
+del broken["emergency"]["phone"]
+assert ps.validate(broken) == (("emergency", "phone"), "is missing")
+
+broken = copy.deepcopy(profile)
+broken["credentials"]["username"] = "../philippo"
+assert ps.validate(broken)[0] == ("credentials", "username")
+
+assert ps.validate_login({"username": "philippo", "password": "123"}) is None
+assert ps.validate_login({"username": "philippo"}) == (("password",), "is missing")
+assert ps.validate_login({"username": "philippo smith", "password": "123"}) is None
+assert ps.validate_login({"username": "", "password": "123"}) == (("username",), "is required")
@@ -0,0 +1,34 @@
+import packages.querylog as ql
+import tempfile
+import time
+
+directory = tempfile.mkdtemp()
+log = ql.QueryLog(directory, "llm", max_bytes=512, batch_size=4, flush_interval=.05)
+log.start()
+start = time.time()
+for i in range(20):
+    log.log(user = "philippo" if i%2 else "nick123", peer = "127.0.0.1:1234", latency = .1, request_id = str(i), query = "Hello")
+log.close()
+
+reader = ql.QueryLogReader(directory, "llm")
+records = list(reader.query("philippo", since=start))
+print(len(ql.list_segments(directory, "llm")), "segments")
+print([r["request_id"] for r in records])
+assert [r["request_id"] for r in records] == [str(i) for i in range(1, 20, 2)]
+assert list(reader.query("philippo", until=start-1)) == []
+
+# Slow requests are logged after faster ones that started later, so with tiny segments
+# their ts ranges overlap and segment names are no bound on what they hold
+directory = tempfile.mkdtemp()
+log = ql.QueryLog(directory, "llm", max_bytes=100, batch_size=1, flush_interval=.05)
+log.start()
+t0 = time.time()-100
+for offset in (0, 20, 10, 3, 50, 4):
+    log.log(user = "philippo", ts = t0+offset, request_id = str(offset))
+    time.sleep(.02)
+log.close()
+print(len(ql.list_segments(directory, "llm")), "segments")
+reader = ql.QueryLogReader(directory, "llm")
+assert sorted(int(r["request_id"]) for r in reader.query("philippo", since=t0+15)) == [20, 50]
+assert sorted(int(r["request_id"]) for r in reader.query("philippo", until=t0+5)) == [0, 3, 4]
+assert list(reader.query("philippo", since=time.time()+60)) == []
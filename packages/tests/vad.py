@@ -0,0 +1,31 @@
+import packages.vad as vad
+import numpy as np
+import time
+
+rate = 16000
+rng = np.random.default_rng(0)
+silence = lambda seconds: (rng.normal(0, 30, int(rate*seconds))).astype("<i2")
+tone = lambda seconds: (8000*np.sin(2*np.pi*220*np.arange(int(rate*seconds))/rate)).astype("<i2")
+
+# 2s silence, 1s speech, 2s pause, 1s speech, 3s silence
+pcm = np.concatenate([silence(2), tone(1), silence(2), tone(1), silence(3)]).tobytes()
+
+start = time.perf_counter()
+trimmed, dropped = vad.trim(pcm, rate)
+print(f"trim: {len(pcm)/2/rate:.1f}s -> {len(trimmed)/2/rate:.2f}s, dropped {dropped:.2f}s in {(time.perf_counter()-start)*1000:.1f}ms")
+assert abs(len(trimmed)/2/rate+dropped-9) < 1e-6
+assert 2 < len(trimmed)/2/rate < 3.5
+
+gate = vad.VoiceGate(rate, stop_after=2.0)
+out = b""
+stopped_at = None
+for i in range(0, len(pcm), 2048):
+    out += gate.feed(pcm[i:i+2048])
+    if gate.should_stop and stopped_at is None:
+        stopped_at = i/2/rate
+gate.flush()
+print(f"gate: kept {len(out)/2/rate:.2f}s, dropped {gate.dropped_seconds:.2f}s, auto stop at {stopped_at:.2f}s")
+assert abs(len(out)/2/rate+gate.dropped_seconds-9) < 1e-6
+assert 2 < len(out)/2/rate < 3.5
+assert 7.9 < stopped_at < 8.2
+assert vad.trim(silence(1).tobytes(), rate)[0] == b""
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+# Spans are written in the Chrome trace event "JSON array" format, which allows the
+# closing bracket to be missing, so each process can append to its own file as it goes.
+# Open the files (or a merged one, see merge()) in ui.perfetto.dev or chrome://tracing.
+# Every launch starts a new file and nothing rotates them, so tracing is off unless
+# HUSH_TRACE=1 is set for the run being looked at.
+
+TRACE_DIR = os.path.join(os.getcwd(), "logs")
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+def now_us():
+    return time.time_ns()//1000
+
+class Span:
+    def __init__(self, tracer, name: str, trace_id: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = now_us()
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+
+    def end(self, **args):
+        if self.start is None:
+            return
+        self.args.update(args)
+        self.tracer.record(self.name, self.trace_id, self.start, now_us(), **self.args)
+        self.start = None
+
+class Tracer:
+    def __init__(self, process_name: str = None, directory: str = TRACE_DIR, enabled: bool = None):
+        self.process_name = process_name or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+        self.directory = directory
+        self.enabled = os.environ.get("HUSH_TRACE", "0") == "1" if enabled is None else enabled
+        self.pid = os.getpid()
+        self.file = None
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"trace-{self.process_name}-{self.pid}.json")
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(self.path, "a")
+        if self.file.tell() == 0:
+            self.file.write("[\n")
+        self.write({"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": self.process_name}})
+
+    def write(self, event: dict):
+        self.file.write(json.dumps(event, separators=(",", ":"), default=str)+",\n")
+        self.file.flush()
+
+    def emit(self, event: dict):
+        if not self.enabled:
+            return
+        event.setdefault("pid", self.pid)
+        event.setdefault("tid", threading.get_ident())
+        with self.lock:
+            if self.file is None:
+                self.open()
+            self.write(event)
+
+    def span(self, name: str, trace_id: str, **args):
+        return Span(self, name, trace_id, args)
+
+    def record(self, name: str, trace_id: str, start: int, end: int, **args):
+        args["trace_id"] = trace_id
+        self.emit({"name": name, "cat": "hush", "ph": "X", "ts": start, "dur": max(0, end-start), "args": args})
+
+    def instant(self, name: str, trace_id: str, **args):
+        args["trace_id"] = trace_id
+        self.emit({"name": name, "cat": "hush", "ph": "i", "s": "t", "ts": now_us(), "args": args})
+
+    # Flow events draw an arrow between the sending and the receiving side of a request
+    def flow_start(self, trace_id: str):
+        self.emit({"name": "request", "cat": "flow", "ph": "s", "id": trace_id, "ts": now_us()})
+
+    def flow_end(self, trace_id: str):
+        self.emit({"name": "request", "cat": "flow", "ph": "f", "bp": "e", "id": trace_id, "ts": now_us()})
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+tracer = Tracer()
+
+def set_process_name(name: str):
+    with tracer.lock:
+        tracer.process_name = name
+        if tracer.file:
+            tracer.file.close()
+            tracer.file = None
+
+def load(path: str):
+    with open(path) as f:
+        text = f.read().rstrip().rstrip(",")
+    if not text.endswith("]"):
+        text += "]"
+    return json.loads(text)
+
+def merge(output: str, paths: list):
+    events = []
+    for path in paths:
+        events += load(path)
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+if __name__ == "__main__":
+    import glob
+    if len(sys.argv) < 2:
+        print("usage: python -m packages.tracing OUTPUT [TRACE_FILE ...]")
+        sys.exit(1)
+    paths = sys.argv[2:] or sorted(glob.glob(os.path.join(TRACE_DIR, "trace-*.json")))
+    print(f"Merged {merge(sys.argv[1], paths)} events from {len(paths)} files into {sys.argv[1]}")
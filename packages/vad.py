@@ -0,0 +1,106 @@
+import collections
+
+import numpy as np
+
+# Voice activity detection on 16-bit mono PCM from frame energy and zero crossings.
+# A frame is speech when it is loud enough, or quieter but with many zero crossings
+# (unvoiced sounds like "s" or "f"). Speech is extended by a hangover after it and a
+# pre-roll before it, so word tails and onsets are not clipped; everything else is dropped.
+
+FRAME_MS = 20
+ENERGY_THRESHOLD = 0.02  # frame RMS as a fraction of full scale
+ZCR_THRESHOLD = 0.25  # zero crossings per sample
+HANGOVER_MS = 300
+PREROLL_MS = 100
+
+def to_samples(pcm: bytes):
+    return np.frombuffer(pcm, dtype="<i2")
+
+def frame_features(samples: np.ndarray, frame_len: int):
+    count = len(samples)//frame_len
+    frames = samples[:count*frame_len].reshape(count, frame_len).astype(np.float32)/32768
+    rms = np.sqrt(np.mean(frames*frames, axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1)/frame_len
+    return rms, zcr
+
+def speech_frames(samples: np.ndarray, frame_len: int, energy_threshold: float = ENERGY_THRESHOLD, zcr_threshold: float = ZCR_THRESHOLD):
+    rms, zcr = frame_features(samples, frame_len)
+    return (rms >= energy_threshold) | ((rms >= energy_threshold/4) & (zcr >= zcr_threshold))
+
+# Marks every frame that has speech up to `before` frames after it or `after` frames before it
+def spread(mask: np.ndarray, before: int, after: int):
+    return np.convolve(mask, np.ones(before+after+1))[before:before+len(mask)] > 0
+
+def ms_to_frames(ms: int):
+    return max(ms//FRAME_MS, 0)
+
+# Trims a whole recording: returns (pcm, seconds dropped)
+def trim(pcm: bytes, rate: int = 16000, energy_threshold: float = ENERGY_THRESHOLD, zcr_threshold: float = ZCR_THRESHOLD,
+         hangover_ms: int = HANGOVER_MS, preroll_ms: int = PREROLL_MS):
+    samples = to_samples(pcm)
+    frame_len = rate*FRAME_MS//1000
+    if len(samples) < frame_len:
+        return pcm, 0.0
+    keep = spread(speech_frames(samples, frame_len, energy_threshold, zcr_threshold), ms_to_frames(preroll_ms), ms_to_frames(hangover_ms))
+    # The partial frame at the end goes with the last full frame
+    keep = np.repeat(keep, frame_len)
+    keep = np.concatenate([keep, np.full(len(samples)-len(keep), keep[-1])])
+    kept = samples[keep]
+    return kept.tobytes(), (len(samples)-len(kept))/rate
+
+# The same decisions made incrementally, for chunks as they come off the microphone.
+# feed() returns the audio to pass on; held back pre-roll frames are released once speech starts.
+class VoiceGate:
+    def __init__(self, rate: int = 16000, stop_after: float = None, energy_threshold: float = ENERGY_THRESHOLD,
+                 zcr_threshold: float = ZCR_THRESHOLD, hangover_ms: int = HANGOVER_MS, preroll_ms: int = PREROLL_MS):
+        self.rate = rate
+        self.stop_after = stop_after
+        self.energy_threshold = energy_threshold
+        self.zcr_threshold = zcr_threshold
+        self.frame_len = rate*FRAME_MS//1000
+        self.frame_bytes = self.frame_len*2
+        self.hangover = ms_to_frames(hangover_ms)
+        self.preroll = collections.deque(maxlen=ms_to_frames(preroll_ms))
+        self.pending = b""
+        self.heard = False
+        self.silent_frames = 0
+        self.dropped_bytes = 0
+
+    def feed(self, pcm: bytes):
+        data = self.pending+pcm
+        count = len(data)//self.frame_bytes
+        self.pending = data[count*self.frame_bytes:]
+        if not count:
+            return b""
+        speech = speech_frames(to_samples(data[:count*self.frame_bytes]), self.frame_len, self.energy_threshold, self.zcr_threshold)
+        out = []
+        for i, voiced in enumerate(speech):
+            frame = data[i*self.frame_bytes:(i+1)*self.frame_bytes]
+            self.silent_frames = 0 if voiced else self.silent_frames+1
+            self.heard = self.heard or voiced
+            if voiced or (self.heard and self.silent_frames <= self.hangover):
+                out.extend(self.preroll)
+                self.preroll.clear()
+                out.append(frame)
+            else:
+                if len(self.preroll) == self.preroll.maxlen:
+                    self.dropped_bytes += self.frame_bytes
+                if self.preroll.maxlen:
+                    self.preroll.append(frame)
+                else:
+                    self.dropped_bytes += self.frame_bytes
+        return b"".join(out)
+
+    def flush(self):
+        self.dropped_bytes += len(self.pending)+sum(len(frame) for frame in self.preroll)
+        self.pending = b""
+        self.preroll.clear()
+
+    @property
+    def should_stop(self):
+        return self.stop_after is not None and self.heard and self.silent_frames*FRAME_MS >= self.stop_after*1000
+
+    @property
+    def dropped_seconds(self):
+        return self.dropped_bytes/2/self.rate
@@ -1,10 +1,29 @@
 import packages.connectors as connectors
+import packages.config as config
+import packages.metrics as metrics
+import packages.tracing as tracing
+import packages.profilecache as profilecache
+import packages.profilestore as profilestore
 
-print("accessible thru",connectors.getPrivateIp())
-llmss = connectors.llmServerSide()
-proflss = connectors.profilesServerSide()
-audescss = connectors.audioDescServerSide(llmss=llmss)
+# The password hashing pool spawns worker processes that re-import this module,
+# so the services must only be started from the real entry point.
+if __name__ == "__main__":
+    tracing.set_process_name("backend")
 
-llmss.start()
-proflss.start()
-audescss.start()
\ No newline at end of file
+    print("accessible thru",connectors.getPrivateIp())
+    visionss = None
+    if config.VISION_ENABLED:
+        # The detector loads first, so a missing install stops the backend before any service listens
+        visionss = connectors.visionServerSide()
+        visionss.load()
+    profiles = profilecache.ProfileCache(profilestore.open_store())
+    proflss = connectors.profilesServerSide(profiles=profiles)
+    llmss = connectors.llmServerSide(profiles=profiles, signer=proflss.sessions)
+    audescss = connectors.audioDescServerSide(llmss=llmss, signer=proflss.sessions)
+
+    llmss.start()
+    proflss.start()
+    audescss.start()
+    if visionss:
+        visionss.start()
+    metrics.serve(connectors.METRICS_PORT)